@@ -12,8 +12,57 @@ def parseargs():
         help="Skips introduction explanation and only asks questions relevant to first time setup"
     )
 
+    # Add --engine flag
+    parser.add_argument(
+        "--engine",
+        choices=["async", "sync"],
+        default="async",
+        help="Monitoring engine to use. 'async' checks Twitch, farms and notifies concurrently, 'sync' is the original blocking loop"
+    )
+
+    # Add --eventsub flag
+    parser.add_argument(
+        "--eventsub",
+        action="store_true",
+        help="Get go-live/go-offline events pushed through an EventSub WebSocket instead of polling. Requires user_access_token in .env"
+    )
+
+    # Add --poller flag
+    parser.add_argument(
+        "--poller",
+        metavar="HOST:PORT",
+        help="Get live status from a running poller.py instead of checking Twitch directly. Set poller_secret in .env if the poller requires it"
+    )
+
+    # Add --log-format flag
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Format of the log file. 'json' writes one JSON object per line for machine parsing"
+    )
+
+    # Add --show-schedules flag
+    parser.add_argument(
+        "--show-schedules",
+        nargs="?",
+        const="",
+        metavar="STREAMER",
+        help="Shows the learned go-live schedules of every streamer, or the weekly schedule of one streamer, and exits"
+    )
+
+    # Add --show-history flag
+    parser.add_argument(
+        "--show-history",
+        nargs="?",
+        const=0,
+        type=int,
+        metavar="DAYS",
+        help="Shows the farming hours per channel, of all time or of the last DAYS days, and exits"
+    )
+
     # Parse the arguments
     args = parser.parse_args()
 
-    # Access the flag (will be True if --skip-intro or -skipintro is provided)
-    return args.skip_intro
\ No newline at end of file
+    # Access the flags (skip_intro will be True if --skip-intro or -skipintro is provided)
+    return args
\ No newline at end of file
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+from fake_helix import FakeHelix # Import local Helix stand-in
+from transport import Transport # Import HTTP transport
+from twitchauth import TwitchAuth # Import TwitchAuth class
+from usercache import UserCache # Import user info cache
+from farmer import Farmer # Import Farmer class
+from streamers import StreamerList # Import streamer list loader
+
+# Metrics that count as a regression when they grow by more than the tolerance
+COMPARED_METRICS = ("cycle_median_seconds", "cycle_p95_seconds", "requests_per_cycle", "memory_bytes")
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Measure poll-cycle latency, requests per cycle and memory against a local fake Helix server as the streamer list grows.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Streamer list sizes to measure")
+    parser.add_argument("--cycles", type=int, default=10, help="Poll cycles measured per list size")
+    parser.add_argument("--live-ratio", type=float, default=0.1, help="Share of streamers that are live")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake server adds to every Helix response")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of Helix requests answered with an injected 429")
+    parser.add_argument("--output", help="Write the results to this JSON file, to use as a baseline later")
+    parser.add_argument("--compare", help="Compare the results to a baseline JSON file and exit with an error on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth over the baseline before a metric counts as a regression")
+    return parser.parse_args()
+
+def setup_farmer(helix, streamers, folder):
+    # Fresh transport and caches, so nothing carries over between list sizes
+    auth = TwitchAuth("benchmark", "benchmark", transport=Transport(), token_file=os.path.join(folder, "token.json"), api_base_url=helix.api_base_url, oauth_url=helix.oauth_url)
+    auth.authenticate()
+
+    user_cache = UserCache(auth, os.path.join(folder, "users.json"))
+    user_cache.refresh(streamers)
+
+    # The farmer reads streamer options like priority from the list, so it gets a real one
+    streamer_list = StreamerList(os.path.join(folder, "streamers.txt"))
+    with open(streamer_list.filename, 'w') as file:
+        file.write("\n".join(streamers))
+    streamer_list.reload()
+
+    config = {"check_interval": 15, "max_idle_duration": 300, "notification": False, "autofarming": False}
+    farmer = Farmer(config, auth, user_cache, streamer_list)
+    farmer.download_profile_image = lambda user_info: None
+    return auth, farmer
+
+def run_cycle(auth, farmer, streamers):
+    # One full poll cycle, like check_stream_status: batched /streams requests followed by the farming update
+    live_streams = auth.get_live_streams_batch(user_logins=streamers)
+    if live_streams is None:
+        return False
+    farmer.update_streamers(streamers, live_streams, 0)
+    return True
+
+def benchmark_size(helix, size, cycles):
+    streamers = [f"streamer{index}" for index in range(size)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Memory held by the transport, user cache and streamer states after the first cycle
+        tracemalloc.start()
+        auth, farmer = setup_farmer(helix, streamers, folder)
+        run_cycle(auth, farmer, streamers)
+        memory_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        cycle_times = []
+        failed_cycles = 0
+        requests_before = helix.stats["requests"]
+        for _ in range(cycles):
+            start = time.perf_counter()
+            if not run_cycle(auth, farmer, streamers):
+                failed_cycles += 1
+            cycle_times.append(time.perf_counter() - start)
+        requests = helix.stats["requests"] - requests_before
+
+    cycle_times.sort()
+    return {
+        "size": size,
+        "live": sum(helix.is_live(streamer) for streamer in streamers),
+        "cycle_median_seconds": statistics.median(cycle_times),
+        "cycle_p95_seconds": cycle_times[min(int(len(cycle_times) * 0.95), len(cycle_times) - 1)],
+        "requests_per_cycle": requests / cycles,
+        "failed_cycles": failed_cycles,
+        "memory_bytes": memory_bytes,
+    }
+
+def compare_results(results, baseline, tolerance):
+    # Returns a description of every metric that grew more than the tolerance over the baseline
+    regressions = []
+    baseline_by_size = {result["size"]: result for result in baseline}
+    for result in results:
+        baseline_result = baseline_by_size.get(result["size"])
+        if not baseline_result:
+            continue
+        for metric in COMPARED_METRICS:
+            if baseline_result[metric] and result[metric] > baseline_result[metric] * (1 + tolerance):
+                regressions.append(f"{result['size']} streamers: {metric} {baseline_result[metric]:.4g} -> {result[metric]:.4g}")
+    return regressions
+
+if __name__ == "__main__":
+    args = parseargs()
+    logging.basicConfig(level=logging.ERROR)  # Retried 429s would flood the output
+
+    # The rate limit is left high, so the benchmark measures the farmer and not the token bucket
+    helix = FakeHelix(live_ratio=args.live_ratio, latency=args.latency, rate_limit_ratio=args.rate_limit_ratio, rate_limit=1000000).start()
+
+    results = []
+    print(f"{'streamers':>10} {'live':>7} {'median':>10} {'p95':>10} {'req/cycle':>10} {'failed':>7} {'memory':>10}")
+    for size in args.sizes:
+        result = benchmark_size(helix, size, args.cycles)
+        results.append(result)
+        print(f"{result['size']:>10} {result['live']:>7} {result['cycle_median_seconds'] * 1000:>8.1f}ms {result['cycle_p95_seconds'] * 1000:>8.1f}ms {result['requests_per_cycle']:>10.1f} {result['failed_cycles']:>7} {result['memory_bytes'] / 1024 / 1024:>8.2f}MB")
+    helix.stop()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare_results(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Regressions compared to the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions compared to the baseline.")
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+import subprocess
+
+# Files cached between runs, moved out of the way for cold starts
+CACHE_FILES = ("token.json", "users.json")
+READY_LINE = "Script is ready!"
+FIRST_CHECK_LINE = "First check complete!"
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Measure the cold and warm time-to-first-poll of main.py. Run it from the folder with config.json and .env.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold and warm runs")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the first check of a run")
+    parser.add_argument("--engine", choices=["async", "sync"], default="async", help="Monitoring engine to start")
+    return parser.parse_args()
+
+def run_once(engine, timeout):
+    # Returns the seconds until the script was ready and until its first check was done
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py", "--skip-intro", "--engine", engine], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    # Kill runs that hang, for example on a "Press any key" prompt
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+
+    ready_time = None
+    first_check_time = None
+    try:
+        # Logging goes to the console, so wait for the lines that mark the startup steps
+        for line in process.stdout:
+            if READY_LINE in line and ready_time is None:
+                ready_time = time.perf_counter() - start
+            elif FIRST_CHECK_LINE in line:
+                first_check_time = time.perf_counter() - start
+                break
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+
+    return ready_time, first_check_time
+
+def move_caches(suffix_from, suffix_to):
+    for filename in CACHE_FILES:
+        if os.path.exists(filename + suffix_from):
+            os.replace(filename + suffix_from, filename + suffix_to)
+
+def print_results(name, results):
+    for index, label in ((0, "ready"), (1, "first check")):
+        times = [result[index] for result in results if result[index] is not None]
+        if not times:
+            print(f"{name:<5} {label:<12} no successful runs")
+            continue
+        print(f"{name:<5} {label:<12} min {min(times):6.2f}s  median {statistics.median(times):6.2f}s  max {max(times):6.2f}s  ({len(times)}/{len(results)} runs)")
+
+if __name__ == "__main__":
+    args = parseargs()
+
+    # Keep the user's caches safe, cold runs start without them and the last cold run creates fresh ones for the warm runs
+    move_caches("", ".benchmark-backup")
+    try:
+        cold_results = []
+        for _ in range(args.runs):
+            move_caches("", ".benchmark-cold")
+            cold_results.append(run_once(args.engine, args.timeout))
+
+        warm_results = [run_once(args.engine, args.timeout) for _ in range(args.runs)]
+    finally:
+        for filename in CACHE_FILES:
+            for suffix in ("", ".benchmark-cold"):
+                if os.path.exists(filename + suffix):
+                    os.remove(filename + suffix)
+        move_caches(".benchmark-backup", "")
+
+    print_results("cold", cold_results)
+    print_results("warm", warm_results)
@@ -29,19 +29,51 @@
 #⠀⠀⠀⠀⠀⠀⠀⠀⠀⠉⠑⠒⠤⠞⠻⠦⢄⡟⠋⠒⠃⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀⠀
 
 import os
+import socket
 import logging
-from selenium import webdriver
 
-def init_browser():
+def init_browser(debugging_port=None, user_data_dir=None):
+    # Selenium takes a while to import, so only load it once a browser is actually needed
+    from selenium import webdriver
+
     options = webdriver.ChromeOptions()
-    options.add_argument(rf"--user-data-dir=C:\Users\{os.getenv('USERNAME')}\AppData\Local\Google\Chrome\User Data")
+    # Recent Chrome versions only allow remote debugging with a user data dir other than the default one
+    if not user_data_dir:
+        user_data_dir = rf"C:\Users\{os.getenv('USERNAME')}\AppData\Local\Google\Chrome\User Data"
+    options.add_argument(f"--user-data-dir={user_data_dir}")
     options.add_argument(r'--profile-directory=Profile 1')
     options.add_experimental_option("detach", True)
+
+    # Let the next run attach to this browser instead of starting a new one
+    if debugging_port:
+        options.add_argument(f"--remote-debugging-port={debugging_port}")
+
     options.add_argument("--start-maximized")
     options.add_experimental_option("excludeSwitches", ['enable-automation', 'enable-logging'])
     logging.info("Browser initiated!")
     return webdriver.Chrome(options=options)
 
+def attach_browser(debugging_port):
+    # Only try to attach if something listens on the debugging port, attaching to nothing takes a long time to fail
+    try:
+        socket.create_connection(("127.0.0.1", debugging_port), timeout=1).close()
+    except OSError:
+        return None
+
+    from selenium import webdriver
+
+    # Connect to the browser left open by the last run, its tabs keep playing
+    options = webdriver.ChromeOptions()
+    options.debugger_address = f"127.0.0.1:{debugging_port}"
+    try:
+        driver = webdriver.Chrome(options=options)
+    except Exception as e:
+        logging.warning(f"Could not attach to the browser on port {debugging_port}, starting a new one: {str(e)}")
+        return None
+
+    logging.info(f"Attached to the running browser on port {debugging_port}!")
+    return driver
+
 def check_browser_open(driver):
     try:
         # Check if the driver is still open and has at least one window handle
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Runs inside every farm tab. It watches the channel points summary with a MutationObserver, clicks the bonus chest
+# as soon as Twitch shows it, and keeps the claim times in the page until the farmer collects them
+CLAIMER_SCRIPT = """
+(function () {
+    if (window.__farmerClaimer) {
+        return;
+    }
+    window.__farmerClaimer = true;
+    window.__farmerClaims = window.__farmerClaims || [];
+
+    var SUMMARY_SELECTOR = '[data-test-selector="community-points-summary"], .community-points-summary';
+    var BONUS_SELECTOR = 'button[aria-label="Claim Bonus"], .claimable-bonus__icon';
+    var summary = null;
+    var observer = new MutationObserver(claim);
+    var lastBonus = null;
+
+    function claim() {
+        var bonus = summary && summary.querySelector(BONUS_SELECTOR);
+        // The same chest is only clicked once, Twitch removes it after the claim
+        if (!bonus || bonus === lastBonus) {
+            return;
+        }
+        lastBonus = bonus;
+        (bonus.closest('button') || bonus).click();
+        window.__farmerClaims.push(Date.now());
+    }
+
+    function attach() {
+        // Only the points summary is observed, so chat and video updates don't wake the observer
+        var found = document.querySelector(SUMMARY_SELECTOR);
+        if (found && found !== summary) {
+            observer.disconnect();
+            summary = found;
+            observer.observe(summary, {childList: true, subtree: true, attributes: true, attributeFilter: ['aria-label', 'class']});
+            claim();
+        }
+    }
+
+    function start() {
+        attach();
+
+        // Twitch renders the summary late and replaces it when switching channels, look for it again now and then
+        setInterval(attach, 10000);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', start);
+    } else {
+        start();
+    }
+})();
+"""
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bonus_chest.html")
+
+COLLECT_SCRIPT = "return window.__farmerClaims ? window.__farmerClaims.splice(0).length : null"
+
+def register_claimer(driver):
+    # Run the claimer on every page the current tab loads from now on, including reloads. Returns the identifier of the page script
+    try:
+        return driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": CLAIMER_SCRIPT})["identifier"]
+    except Exception:
+        logging.debug("Could not register the bonus claimer for new pages, it is only run on the current page")
+        return None
+
+def run_claimer(driver):
+    # Run the claimer on the page that is already loaded, it does nothing if it's already running
+    try:
+        driver.execute_script(CLAIMER_SCRIPT)
+    except Exception as e:
+        logging.error(f"Could not start the bonus claimer: {str(e)}")
+
+def collect_claims(driver):
+    # Claims made since the last collection, None if the claimer isn't running on the page
+    return driver.execute_script(COLLECT_SCRIPT)
+
+def run_fixture(driver, fixture, duration):
+    # Bonus chests the fixture page showed, the chests that were clicked and the claims the claimer reported
+    # Registered before loading the page, the same way farm tabs get the claimer
+    register_claimer(driver)
+    driver.get(f"file:///{os.path.abspath(fixture)}")
+    run_claimer(driver)
+    time.sleep(duration)
+
+    # Read together, so a chest shown in between can't make the numbers disagree
+    return driver.execute_script("return [window.bonusesShown, window.bonusesClicked, window.__farmerClaims ? window.__farmerClaims.splice(0).length : null]")
+
+def check_fixture_result(shown, clicked, claims):
+    # Every chest has to be clicked once, and every click reported once
+    return bool(shown) and clicked == shown and claims == clicked
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Runs the bonus claimer against the local fixture page, which shows a bonus chest every few seconds. Exits with 1 if a chest was missed.")
+    parser.add_argument("--fixture", default=FIXTURE)
+    parser.add_argument("--duration", type=int, default=20, help="Seconds to run the fixture page")
+    parser.add_argument("--headless", action="store_true")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] (%(levelname)s): %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    args = parseargs()
+
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    if args.headless:
+        options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+
+    try:
+        shown, clicked, claims = run_fixture(driver, args.fixture, args.duration)
+    finally:
+        driver.quit()
+
+    logging.info(f"Bonus chests shown: {shown}, clicked: {clicked}, claims reported: {claims}")
+    if not check_fixture_result(shown, clicked, claims):
+        logging.error("The claimer missed bonus chests or reported the wrong number of claims!")
+        sys.exit(1)
@@ -0,0 +1,164 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from idle import check_idle_duration # Import idle detection functions
+
+class AsyncEngine:
+    def __init__(self, config, auth, user_cache, streamer_list, farmer, scheduler, eventsub=None, metrics=None, idle_monitor=None, max_concurrency=4):
+        self.config = config
+        self.auth = auth
+        self.user_cache = user_cache
+        self.streamer_list = streamer_list
+        self.farmer = farmer
+        self.scheduler = scheduler
+        self.eventsub = eventsub
+        self.metrics = metrics
+        self.idle_monitor = idle_monitor
+        self.max_concurrency = max_concurrency
+
+        # Selenium WebDriver is not thread safe, so every farming action runs on the same single thread
+        self.farm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="farm")
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.request_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.farm_queue = asyncio.Queue()
+
+        tasks = [self.poll_task(), self.farm_task()]
+        if self.eventsub:
+            tasks.append(self.eventsub_task())
+        if self.idle_monitor:
+            tasks.append(self.idle_task())
+        await asyncio.gather(*tasks)
+
+    async def run_request(self, function, *args, **kwargs):
+        # Limit the number of Helix requests in flight at the same time
+        async with self.request_semaphore:
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def poll_task(self):
+        check_interval = self.config.get('check_interval')
+
+        # Check every streamer in the list right away
+        self.scheduler.add_streamers(self.streamer_list.streamers)
+        next_list_check_time = time.time()
+
+        while True:
+            current_time = time.time()
+
+            # Check the streamer list and the cached user info once every check interval
+            if current_time >= next_list_check_time:
+                # Read streamer names from the streamer list, if it changed
+                added, removed = await asyncio.to_thread(self.streamer_list.reload)
+
+                # Forget streamers that were removed from the list, and check new streamers right away
+                if removed:
+                    self.farm_queue.put_nowait((self.farmer.remove_streamers, (removed,)))
+                    self.scheduler.remove_streamers(removed)
+                if added:
+                    self.scheduler.add_streamers(added)
+                if self.eventsub and (added or removed):
+                    self.eventsub.set_streamers(self.streamer_list.streamers)
+
+                # Look up user info for new streamers and streamers whose cached info expired
+                await asyncio.to_thread(self.user_cache.refresh, self.streamer_list.streamers)
+
+                next_list_check_time = current_time + check_interval
+
+            # Get the streamers that are due to be checked
+            due_streamers = self.scheduler.pop_due_streamers()
+
+            # Streamers covered by EventSub are handled by the EventSub task, only the rest has to be polled
+            if self.eventsub:
+                pushed_streamers, due_streamers = self.eventsub.split_streamers(due_streamers)
+
+                # Due pushed streamers still get checked against the pushed live streams, so a streamer that went offline
+                # is confirmed after the offline pending check interval, instead of waiting for the next EventSub change
+                if pushed_streamers:
+                    self.farm_queue.put_nowait((self.update_pushed_streamers, (pushed_streamers, check_idle_duration())))
+
+            # Check which streamers are live, sending every batch of 100 streamers concurrently
+            cycle_start_time = time.monotonic()
+            batches = [due_streamers[start:start + self.auth.BATCH_SIZE] for start in range(0, len(due_streamers), self.auth.BATCH_SIZE)]
+            results = await asyncio.gather(*(self.run_request(self.auth.get_live_streams_batch, user_logins=batch) for batch in batches))
+
+            checked_streamers = []
+            live_streams = {}
+            for batch, batch_live_streams in zip(batches, results):
+                # Retry streamers in a failed batch later, instead of considering them offline
+                if batch_live_streams is None:
+                    logging.warning(f"Could not check live streams for {len(batch)} streamers, retrying in {check_interval} seconds!")
+                    self.scheduler.reschedule_streamers(batch, check_interval)
+                    continue
+                checked_streamers += batch
+                live_streams.update(batch_live_streams)
+
+            # Hand the results to the farming task, together with the current user inactivity
+            if checked_streamers:
+                self.farm_queue.put_nowait((self.update_streamers, (checked_streamers, live_streams, check_idle_duration(), cycle_start_time, len(due_streamers) - len(checked_streamers))))
+            elif due_streamers and self.metrics:
+                self.metrics.record_poll_cycle(time.monotonic() - cycle_start_time, 0, len(due_streamers), check_idle_duration())
+
+            # Sleep until the next streamer is due, the streamer list has to be checked, or something wakes the scheduler up
+            await asyncio.to_thread(self.scheduler.wait, max(next_list_check_time - time.time(), 0))
+
+    def update_streamers(self, streamers, live_streams, idle_duration, cycle_start_time, failed_count):
+        # Runs on the farming thread, streamers are rescheduled based on their new state, also if the update failed,
+        # since they were taken off the schedule and would never be checked again otherwise
+        try:
+            self.farmer.update_streamers(streamers, live_streams, idle_duration)
+        finally:
+            self.scheduler.reschedule_streamers(streamers)
+
+        # The poll cycle ends once the farming update is done
+        if self.metrics:
+            self.metrics.record_poll_cycle(time.monotonic() - cycle_start_time, len(streamers), failed_count, idle_duration)
+
+    def get_pushed_live_streams(self, pushed_streamers):
+        pushed_logins = {streamer_login.lower() for streamer_login in pushed_streamers}
+        return {streamer_login: stream for streamer_login, stream in self.eventsub.get_live_streams().items() if streamer_login in pushed_logins}
+
+    def update_pushed_streamers(self, streamers, idle_duration):
+        # Runs on the farming thread, with the live streams EventSub knows about by then
+        try:
+            self.farmer.update_streamers(streamers, self.get_pushed_live_streams(streamers), idle_duration)
+        finally:
+            self.scheduler.reschedule_streamers(streamers)
+
+    async def eventsub_task(self):
+        while True:
+            # Wait for EventSub to report a change, checking the pushed streamers at least every check interval
+            await asyncio.to_thread(self.eventsub.changed.wait, self.config.get('check_interval'))
+            self.eventsub.changed.clear()
+
+            pushed_streamers = self.eventsub.split_streamers(self.streamer_list.streamers)[0]
+            if not pushed_streamers:
+                continue
+
+            live_streams = self.get_pushed_live_streams(pushed_streamers)
+            self.farm_queue.put_nowait((self.farmer.update_streamers, (pushed_streamers, live_streams, check_idle_duration())))
+
+    async def idle_task(self):
+        while True:
+            # Wait for the user to go idle or come back
+            await asyncio.to_thread(self.idle_monitor.changed.wait, self.config.get('check_interval'))
+            if not self.idle_monitor.changed.is_set():
+                continue
+            self.idle_monitor.changed.clear()
+
+            self.farm_queue.put_nowait((self.farmer.set_idle, (self.idle_monitor.idle,)))
+
+    async def farm_task(self):
+        while True:
+            # Updates are handled in order, since polled and pushed updates cover different streamers
+            action, args = await self.farm_queue.get()
+
+            try:
+                await self.loop.run_in_executor(self.farm_executor, action, *args)
+            except Exception:
+                logging.exception("Error while updating farmed streamers!")
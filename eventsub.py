@@ -0,0 +1,263 @@
+import json
+import time
+import logging
+import threading
+import websocket
+
+class EventSubClient:
+    EVENTSUB_URL = "wss://eventsub.wss.twitch.tv/ws"
+    SUBSCRIPTION_TYPES = ("stream.online", "stream.offline")
+    MAX_SUBSCRIPTIONS = 300  # Maximum number of enabled subscriptions per WebSocket session, the cost limit is usually reached first
+    KEEPALIVE_GRACE = 5  # Extra seconds to wait for a keepalive before considering the session dead
+    RECONNECT_DELAY = 5
+
+    def __init__(self, auth, user_cache, user_access_token, url=None):
+        self.auth = auth
+        self.user_cache = user_cache
+        self.user_access_token = user_access_token
+        self.url = url or self.EVENTSUB_URL
+
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.changed = threading.Event()  # Set whenever a subscribed streamer goes live or offline
+        self.on_change = None  # Optional callback to wake up the engine on a change
+
+        self.connected = False
+        self.session_id = None
+        self.keepalive_timeout = 10
+        self.wanted_logins = set()
+        self.subscriptions = {}  # Streamer login to its subscription ids in the current session
+        self.failed_logins = set()  # Streamers that could not be subscribed in the current session
+        self.live_streams = {}  # Streamer login to stream data, for subscribed streamers that are live
+        self.total_cost = 0  # Subscription cost of the session, as reported by the last created subscription
+        self.max_total_cost = None  # Subscription cost limit of the session, unknown until a subscription is created
+        self.cost_limit_reached = False  # Set once the session can't take more subscriptions
+        self.limit_warning = False
+
+    def start(self):
+        threading.Thread(target=self.run, name="eventsub", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def set_streamers(self, streamer_logins):
+        with self.lock:
+            self.wanted_logins = {streamer_login.lower() for streamer_login in streamer_logins}
+
+    def is_connected(self):
+        return self.connected
+
+    def split_streamers(self, streamers):
+        # Streamers with both subscriptions active are pushed, every other streamer still has to be polled
+        with self.lock:
+            if not self.connected:
+                return [], list(streamers)
+            covered_logins = {login for login, subscription_ids in self.subscriptions.items() if len(subscription_ids) == len(self.SUBSCRIPTION_TYPES)}
+
+        pushed_streamers = [streamer_login for streamer_login in streamers if streamer_login.lower() in covered_logins]
+        polled_streamers = [streamer_login for streamer_login in streamers if streamer_login.lower() not in covered_logins]
+        return pushed_streamers, polled_streamers
+
+    def get_live_streams(self):
+        with self.lock:
+            return dict(self.live_streams)
+
+    def set_changed(self):
+        self.changed.set()
+        if self.on_change:
+            self.on_change()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.listen()
+            except (websocket.WebSocketException, OSError, ValueError, KeyError) as e:
+                logging.warning(f"EventSub connection lost, falling back to polling: {str(e)}")
+
+            self.reset_session()
+            self.stopped.wait(self.RECONNECT_DELAY)
+
+    def open_session(self, url):
+        ws = websocket.create_connection(url, timeout=self.keepalive_timeout + self.KEEPALIVE_GRACE)
+
+        # The first message on every connection is the session welcome
+        message = json.loads(ws.recv())
+        if message["metadata"]["message_type"] != "session_welcome":
+            ws.close()
+            raise websocket.WebSocketException(f"Expected session_welcome, got {message['metadata']['message_type']}")
+
+        session = message["payload"]["session"]
+        self.session_id = session["id"]
+        self.keepalive_timeout = session.get("keepalive_timeout_seconds") or self.keepalive_timeout
+        ws.settimeout(1)
+        return ws
+
+    def listen(self):
+        ws = self.open_session(self.url)
+        with self.lock:
+            self.connected = True
+        logging.info("EventSub connected!")
+
+        last_message_time = time.monotonic()
+        try:
+            while not self.stopped.is_set():
+                self.sync_subscriptions()
+
+                try:
+                    message = json.loads(ws.recv())
+                except websocket.WebSocketTimeoutException:
+                    # Twitch sends a keepalive when there are no events, so silence means the session is dead
+                    if time.monotonic() - last_message_time > self.keepalive_timeout + self.KEEPALIVE_GRACE:
+                        raise websocket.WebSocketException("No keepalive received")
+                    continue
+
+                last_message_time = time.monotonic()
+                message_type = message["metadata"]["message_type"]
+
+                if message_type == "notification":
+                    self.handle_notification(message["payload"])
+                elif message_type == "session_reconnect":
+                    # Connect to the new URL before closing the old connection, subscriptions carry over to the new session
+                    new_ws = self.open_session(message["payload"]["session"]["reconnect_url"])
+                    ws.close()
+                    ws = new_ws
+                    logging.info("EventSub reconnected!")
+                elif message_type == "revocation":
+                    self.handle_revocation(message["payload"]["subscription"])
+        finally:
+            ws.close()
+
+    def reset_session(self):
+        # Subscriptions are disabled together with their session, so everything has to be resubscribed
+        with self.lock:
+            was_connected = self.connected
+            self.connected = False
+            self.session_id = None
+            self.subscriptions = {}
+            self.failed_logins = set()
+            self.live_streams = {}
+            self.total_cost = 0
+            self.max_total_cost = None
+            self.cost_limit_reached = False
+
+        # Wake up the engine so the streamers are polled again right away
+        if was_connected:
+            self.set_changed()
+
+    def sync_subscriptions(self):
+        with self.lock:
+            new_logins = [login for login in self.wanted_logins if login not in self.subscriptions and login not in self.failed_logins]
+            removed_logins = [login for login in self.subscriptions if login not in self.wanted_logins]
+
+        # Remove subscriptions for streamers that are no longer in the list
+        for streamer_login in removed_logins:
+            for subscription_id in self.subscriptions[streamer_login]:
+                self.auth.delete_eventsub_subscription(subscription_id, self.user_access_token)
+            with self.lock:
+                self.subscriptions.pop(streamer_login, None)
+                self.live_streams.pop(streamer_login, None)
+
+        # Removed subscriptions free up cost, the next created subscription reports how much is left
+        if removed_logins:
+            self.max_total_cost = None
+            self.cost_limit_reached = False
+
+        if not new_logins or self.cost_limit_reached:
+            return
+
+        # Streamers over the subscription limit stay on polling
+        room = self.MAX_SUBSCRIPTIONS // len(self.SUBSCRIPTION_TYPES) - len(self.subscriptions)
+        if len(new_logins) > room:
+            if not self.limit_warning:
+                logging.warning(f"EventSub can only push {self.MAX_SUBSCRIPTIONS // len(self.SUBSCRIPTION_TYPES)} streamers, the rest will be polled.")
+                self.limit_warning = True
+            new_logins = new_logins[:max(room, 0)]
+            if not new_logins:
+                return
+
+        self.user_cache.refresh(new_logins)
+
+        new_subscriptions = {}
+        for streamer_login in new_logins:
+            # Stop once the session can't take the subscriptions of another streamer, the rest stays on polling
+            if self.max_total_cost is not None and self.max_total_cost - self.total_cost < len(self.SUBSCRIPTION_TYPES):
+                self.cost_limit_reached = True
+            if self.cost_limit_reached:
+                if not self.limit_warning:
+                    logging.warning(f"EventSub reached its subscription cost limit after {len(self.subscriptions) + len(new_subscriptions)} streamers, the rest will be polled.")
+                    self.limit_warning = True
+                break
+
+            user_id = self.user_cache.get_user_id(streamer_login)
+            subscription_ids = []
+
+            if user_id:
+                for subscription_type in self.SUBSCRIPTION_TYPES:
+                    subscription = self.auth.create_eventsub_subscription(subscription_type, {"broadcaster_user_id": user_id}, self.session_id, self.user_access_token)
+                    if subscription and subscription.get("status") == 429:
+                        self.cost_limit_reached = True
+                        break
+                    if subscription and subscription.get("data"):
+                        subscription_ids.append(subscription["data"][0]["id"])
+                        self.total_cost = subscription.get("total_cost", self.total_cost)
+                        self.max_total_cost = subscription.get("max_total_cost", self.max_total_cost)
+
+            if len(subscription_ids) == len(self.SUBSCRIPTION_TYPES):
+                new_subscriptions[streamer_login] = subscription_ids
+                continue
+
+            # A streamer with only some of the subscriptions is polled, remove the ones that were created
+            for subscription_id in subscription_ids:
+                self.auth.delete_eventsub_subscription(subscription_id, self.user_access_token)
+
+            # Streamers left over at the cost limit are subscribed once subscriptions are removed, not marked as failed
+            if not self.cost_limit_reached:
+                with self.lock:
+                    self.failed_logins.add(streamer_login)
+
+        if not new_subscriptions:
+            return
+
+        # Events only report changes, so check once which of the new streamers are already live
+        live_streams = self.auth.get_live_streams_batch(user_logins=list(new_subscriptions))
+
+        with self.lock:
+            if live_streams is None:
+                # Without a known starting state the streamers have to stay on polling
+                self.failed_logins.update(new_subscriptions)
+                return
+
+            # Only count the streamers as pushed once their starting state is known
+            self.subscriptions.update(new_subscriptions)
+            self.live_streams.update(live_streams)
+        self.set_changed()
+
+    def handle_notification(self, payload):
+        subscription_type = payload["subscription"]["type"]
+        event = payload["event"]
+        streamer_login = event["broadcaster_user_login"].lower()
+
+        if subscription_type == "stream.online":
+            # The event has no title, so get the full stream data once
+            live_streams = self.auth.get_live_streams_batch(user_logins=[streamer_login])
+            stream = (live_streams or {}).get(streamer_login) or {"user_login": streamer_login, "title": "", "started_at": event.get("started_at")}
+            with self.lock:
+                self.live_streams[streamer_login] = stream
+            logging.debug(f"EventSub: {streamer_login} went live")
+        elif subscription_type == "stream.offline":
+            with self.lock:
+                self.live_streams.pop(streamer_login, None)
+            logging.debug(f"EventSub: {streamer_login} went offline")
+
+        self.set_changed()
+
+    def handle_revocation(self, subscription):
+        logging.warning(f"EventSub subscription {subscription['type']} was revoked: {subscription.get('status')}")
+
+        # Put the streamer back on polling
+        with self.lock:
+            for streamer_login, subscription_ids in list(self.subscriptions.items()):
+                if subscription["id"] in subscription_ids:
+                    self.subscriptions.pop(streamer_login)
+                    self.live_streams.pop(streamer_login, None)
+                    self.failed_logins.add(streamer_login)
@@ -0,0 +1,148 @@
+import json
+import queue
+import base64
+import struct
+import hashlib
+import secrets
+import threading
+import socketserver
+from datetime import datetime, timezone
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class FakeEventSub:
+    # Local stand-in for the EventSub WebSocket, it sends the welcome, keepalives, notifications and reconnects on demand
+    def __init__(self, port=0, keepalive_timeout=10):
+        self.keepalive_timeout = keepalive_timeout
+        self.silent = False  # Stop sending keepalives, so the session looks dead to the client
+
+        self.lock = threading.Lock()
+        self.connections = []  # Outgoing message queues of the open connections, newest last
+        self.sessions = []  # Session ids in the order they were welcomed
+
+        server = self
+
+        class EventSubHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                if not self.handshake():
+                    return
+
+                outgoing = queue.Queue()
+                session_id = secrets.token_hex(8)
+                with server.lock:
+                    server.connections.append(outgoing)
+                    server.sessions.append(session_id)
+
+                reader = threading.Thread(target=self.read_frames, args=(outgoing,), daemon=True)
+                reader.start()
+
+                try:
+                    self.send_text(server.get_message("session_welcome", {"session": {"id": session_id, "status": "connected", "keepalive_timeout_seconds": server.keepalive_timeout, "reconnect_url": None}}))
+                    while True:
+                        try:
+                            message = outgoing.get(timeout=server.keepalive_timeout / 2)
+                        except queue.Empty:
+                            if not server.silent:
+                                self.send_text(server.get_message("session_keepalive", {}))
+                            continue
+                        if message is None:
+                            break
+                        self.send_text(message)
+                except OSError:
+                    pass
+                finally:
+                    with server.lock:
+                        if outgoing in server.connections:
+                            server.connections.remove(outgoing)
+
+            def handshake(self):
+                headers = {}
+                request_line = self.rfile.readline()
+                if not request_line:
+                    return False
+                for line in iter(self.rfile.readline, b"\r\n"):
+                    if not line:
+                        return False
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest()).decode()
+                self.wfile.write(
+                    "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+                )
+                return True
+
+            def send_text(self, text):
+                payload = text.encode()
+                if len(payload) < 126:
+                    header = struct.pack("!BB", 0x81, len(payload))
+                elif len(payload) < 65536:
+                    header = struct.pack("!BBH", 0x81, 126, len(payload))
+                else:
+                    header = struct.pack("!BBQ", 0x81, 127, len(payload))
+                self.wfile.write(header + payload)
+
+            def read_frames(self, outgoing):
+                # Client frames are only read to notice the close, the client never sends anything else to EventSub
+                try:
+                    while True:
+                        header = self.rfile.read(2)
+                        if len(header) < 2:
+                            break
+                        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+                        if length == 126:
+                            length = struct.unpack("!H", self.rfile.read(2))[0]
+                        elif length == 127:
+                            length = struct.unpack("!Q", self.rfile.read(8))[0]
+                        self.rfile.read(4 + length)
+                        if opcode == 0x8:
+                            break
+                except OSError:
+                    pass
+                outgoing.put(None)
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), EventSubHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.server_address[1]}/ws"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-eventsub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_message(self, message_type, payload, subscription_type=None):
+        metadata = {"message_id": secrets.token_hex(8), "message_type": message_type, "message_timestamp": datetime.now(timezone.utc).isoformat()}
+        if subscription_type:
+            metadata["subscription_type"] = subscription_type
+            metadata["subscription_version"] = "1"
+        return json.dumps({"metadata": metadata, "payload": payload})
+
+    def send(self, message):
+        # Goes out on the newest connection, the one the client listens on after a reconnect
+        with self.lock:
+            outgoing = self.connections[-1]
+        outgoing.put(message)
+
+    def send_notification(self, subscription_type, streamer_login, subscription_id="subscription"):
+        event = {"broadcaster_user_id": "1", "broadcaster_user_login": streamer_login, "broadcaster_user_name": streamer_login}
+        if subscription_type == "stream.online":
+            event.update({"id": "1", "type": "live", "started_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")})
+        subscription = {"id": subscription_id, "type": subscription_type, "version": "1", "status": "enabled"}
+        self.send(self.get_message("notification", {"subscription": subscription, "event": event}, subscription_type))
+
+    def send_reconnect(self):
+        self.send(self.get_message("session_reconnect", {"session": {"id": "reconnect", "status": "reconnecting", "reconnect_url": self.url}}))
+
+    def send_revocation(self, subscription_id, subscription_type="stream.online"):
+        subscription = {"id": subscription_id, "type": subscription_type, "version": "1", "status": "authorization_revoked"}
+        self.send(self.get_message("revocation", {"subscription": subscription}, subscription_type))
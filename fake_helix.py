@@ -0,0 +1,223 @@
+import json
+import time
+import zlib
+import random
+import secrets
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1x1 PNG served as every profile image
+PROFILE_IMAGE = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                              "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+class FakeHelix:
+    BATCH_SIZE = 100
+
+    def __init__(self, port=0, live_ratio=0.1, latency=0.0, latency_jitter=0.0, rate_limit_ratio=0.0, rate_limit=800, token_lifetime=5000000):
+        self.live_ratio = live_ratio
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_limit_ratio = rate_limit_ratio  # Share of requests answered with an injected 429
+        self.rate_limit = rate_limit  # Requests per minute, like the Helix token bucket
+        self.token_lifetime = token_lifetime
+
+        self.lock = threading.Lock()
+        self.tokens = set()
+        self.user_ids = {}  # Login to user id, handed out the first time a login is seen
+        self.logins = {}  # User id to login
+        self.started_at = {}  # Login to stream start, for streamers that are live
+        self.bucket = rate_limit
+        self.bucket_reset = time.time() + 60
+        self.stats = {"requests": 0, "rate_limited": 0, "unauthorized": 0}
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def api_base_url(self):
+        return f"http://127.0.0.1:{self.port}/helix"
+
+    @property
+    def oauth_url(self):
+        return f"http://127.0.0.1:{self.port}/oauth2/token"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-helix", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def is_live(self, login):
+        # Deterministic, so every run sees the same streamers live
+        return zlib.crc32(login.encode()) % 10000 < self.live_ratio * 10000
+
+    def get_user_id(self, login):
+        with self.lock:
+            user_id = self.user_ids.get(login)
+            if user_id is None:
+                user_id = self.user_ids[login] = str(len(self.user_ids) + 1)
+                self.logins[user_id] = login
+            return user_id
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def take_rate_limit(self):
+        # Returns False once the bucket for the current minute is empty
+        with self.lock:
+            now = time.time()
+            if now >= self.bucket_reset:
+                self.bucket = self.rate_limit
+                self.bucket_reset = now + 60
+            if self.bucket <= 0:
+                return False
+            self.bucket -= 1
+            return True
+
+    def get_rate_limit_headers(self):
+        with self.lock:
+            return {"Ratelimit-Limit": str(self.rate_limit), "Ratelimit-Remaining": str(max(self.bucket, 0)), "Ratelimit-Reset": str(int(self.bucket_reset))}
+
+    def get_stream(self, login):
+        user_id = self.get_user_id(login)
+        started_at = self.started_at.setdefault(login, time.time() - random.randint(60, 3600))
+        return {
+            "id": str(zlib.crc32(f"stream-{login}".encode())),
+            "user_id": user_id,
+            "user_login": login,
+            "user_name": login.capitalize(),
+            "game_name": "Just Chatting",
+            "type": "live",
+            "title": f"{login} is live on the fake Helix server",
+            "viewer_count": zlib.crc32(login.encode()) % 5000,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started_at)),
+        }
+
+    def get_user(self, login):
+        return {
+            "id": self.get_user_id(login),
+            "login": login,
+            "display_name": login.capitalize(),
+            "profile_image_url": f"http://127.0.0.1:{self.port}/profile_image/{login}.png",
+        }
+
+    def make_handler(self):
+        helix = self
+
+        class FakeHelixHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+            disable_nagle_algorithm = True  # Headers and body are written separately, don't let them wait on delayed ACKs
+
+            def send_json(self, status_code, data, headers=None):
+                body = json.dumps(data).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                helix.count("requests")
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+
+                if url.path != "/oauth2/token":
+                    self.send_json(404, {"error": "Not Found", "status": 404})
+                    return
+                if not form.get("client_id") or not form.get("client_secret"):
+                    self.send_json(400, {"status": 400, "message": "missing client id or secret"})
+                    return
+
+                access_token = secrets.token_hex(15)
+                with helix.lock:
+                    helix.tokens.add(access_token)
+                self.send_json(200, {"access_token": access_token, "expires_in": helix.token_lifetime, "token_type": "bearer"})
+
+            def do_GET(self):
+                helix.count("requests")
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+
+                if url.path.startswith("/profile_image/"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/png")
+                    self.send_header("Content-Length", str(len(PROFILE_IMAGE)))
+                    self.end_headers()
+                    self.wfile.write(PROFILE_IMAGE)
+                    return
+
+                if helix.latency or helix.latency_jitter:
+                    time.sleep(helix.latency + random.uniform(0, helix.latency_jitter))
+
+                # Every Helix request needs a valid app access token
+                authorization = self.headers.get("Authorization", "")
+                if not authorization.startswith("Bearer ") or authorization[7:] not in helix.tokens:
+                    helix.count("unauthorized")
+                    self.send_json(401, {"error": "Unauthorized", "status": 401, "message": "Invalid OAuth token"})
+                    return
+
+                if not helix.take_rate_limit() or random.random() < helix.rate_limit_ratio:
+                    helix.count("rate_limited")
+                    self.send_json(429, {"error": "Too Many Requests", "status": 429, "message": "Too Many Requests"}, helix.get_rate_limit_headers())
+                    return
+                headers = helix.get_rate_limit_headers()
+
+                if url.path == "/helix/streams":
+                    logins = [login.lower() for login in params.get("user_login", [])]
+                    logins += [helix.logins[user_id] for user_id in params.get("user_id", []) if user_id in helix.logins]
+                    if len(params.get("user_login", [])) + len(params.get("user_id", [])) > helix.BATCH_SIZE:
+                        self.send_json(400, {"error": "Bad Request", "status": 400, "message": "too many user_login and user_id values"}, headers)
+                        return
+                    streams = [helix.get_stream(login) for login in dict.fromkeys(logins) if helix.is_live(login)]
+                    self.send_json(200, {"data": streams, "pagination": {}}, headers)
+                elif url.path == "/helix/users":
+                    logins = [login.lower() for login in params.get("login", [])]
+                    logins += [helix.logins[user_id] for user_id in params.get("id", []) if user_id in helix.logins]
+                    if len(params.get("login", [])) + len(params.get("id", [])) > helix.BATCH_SIZE:
+                        self.send_json(400, {"error": "Bad Request", "status": 400, "message": "too many login and id values"}, headers)
+                        return
+                    self.send_json(200, {"data": [helix.get_user(login) for login in dict.fromkeys(logins)]}, headers)
+                else:
+                    self.send_json(404, {"error": "Not Found", "status": 404}, headers)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeHelixHandler
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Helix /streams and /users endpoints and the OAuth token endpoint.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--live-ratio", type=float, default=0.1, help="Share of streamers that are live")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every Helix response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Up to this many random seconds added on top of the latency")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of Helix requests answered with an injected 429")
+    parser.add_argument("--rate-limit", type=int, default=800, help="Helix requests allowed per minute before every request gets a 429")
+    parser.add_argument("--token-lifetime", type=int, default=5000000, help="Seconds until handed out access tokens expire")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parseargs()
+    helix = FakeHelix(args.port, args.live_ratio, args.latency, args.latency_jitter, args.rate_limit_ratio, args.rate_limit, args.token_lifetime)
+
+    print("Fake Helix listening, point the farmer at it with these .env values:")
+    print(f"helix_api_base_url = {helix.api_base_url}")
+    print(f"helix_oauth_url = {helix.oauth_url}")
+    try:
+        helix.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
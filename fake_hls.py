@@ -0,0 +1,152 @@
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Renditions of every stream, highest first like the real master playlists
+RENDITIONS = [
+    ("chunked", 6000000),
+    ("720p60", 3000000),
+    ("480p30", 1400000),
+    ("160p30", 230000),
+]
+
+class FakeHLS:
+    def __init__(self, port=0, target_duration=2):
+        self.target_duration = target_duration
+        self.fail_playlists = 0  # Media playlist requests still to be answered with a 403, like an expired access token
+
+        self.lock = threading.Lock()
+        self.requests = []  # (time, path) of every request, in order
+        self.live = set()  # Streamer logins with a stream, every other login gets no access token
+        self.start_time = time.time()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def gql_url(self):
+        return f"http://127.0.0.1:{self.port}/gql"
+
+    @property
+    def usher_url(self):
+        return f"http://127.0.0.1:{self.port}/api/channel/hls/{{login}}.m3u8"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-hls", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_requests(self, path_prefix):
+        with self.lock:
+            return [request_time for request_time, path in self.requests if path.startswith(path_prefix)]
+
+    def get_master_playlist(self, login):
+        lines = ["#EXTM3U"]
+        for name, bandwidth in RENDITIONS:
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},CODECS="avc1.4D401F,mp4a.40.2",VIDEO="{name}"')
+            lines.append(f"/hls/{login}/{name}.m3u8")
+        return "\n".join(lines) + "\n"
+
+    def get_media_playlist(self):
+        # Three segments, a new one every target duration
+        sequence = int((time.time() - self.start_time) / self.target_duration)
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{self.target_duration}", f"#EXT-X-MEDIA-SEQUENCE:{sequence}"]
+        for index in range(sequence, sequence + 3):
+            lines.append(f"#EXTINF:{self.target_duration:.3f},live")
+            lines.append(f"segment{index}.ts")
+        return "\n".join(lines) + "\n"
+
+    def make_handler(self):
+        hls = self
+
+        class FakeHLSHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send_body(self, status_code, body, content_type):
+                body = body.encode() if isinstance(body, str) else body
+                self.send_response(status_code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def record(self):
+                url = urlparse(self.path)
+                with hls.lock:
+                    hls.requests.append((time.time(), url.path))
+                return url
+
+            def do_POST(self):
+                url = self.record()
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                if url.path != "/gql":
+                    self.send_body(404, "Not Found", "text/plain")
+                    return
+
+                # The playback access token of the web player, null for channels that don't exist
+                login = body.get("variables", {}).get("login", "")
+                access_token = {"value": json.dumps({"channel": login}), "signature": "fake"} if login in hls.live else None
+                self.send_body(200, json.dumps({"data": {"streamPlaybackAccessToken": access_token}}), "application/json")
+
+            def do_GET(self):
+                url = self.record()
+                params = parse_qs(url.query)
+                parts = [part for part in url.path.split("/") if part]
+
+                if url.path.startswith("/api/channel/hls/"):
+                    login = parts[-1][:-len(".m3u8")]
+                    if login not in hls.live or not params.get("sig") or not params.get("token"):
+                        self.send_body(403, "Forbidden", "text/plain")
+                        return
+                    self.send_body(200, hls.get_master_playlist(login), "application/vnd.apple.mpegurl")
+                elif url.path.startswith("/hls/") and url.path.endswith(".m3u8"):
+                    with hls.lock:
+                        failed = hls.fail_playlists > 0
+                        if failed:
+                            hls.fail_playlists -= 1
+                    if failed or parts[1] not in hls.live:
+                        self.send_body(403, "Forbidden", "text/plain")
+                        return
+                    self.send_body(200, hls.get_media_playlist(), "application/vnd.apple.mpegurl")
+                elif url.path.startswith("/hls/") and url.path.endswith(".ts"):
+                    self.send_body(200, bytes(188 * 10), "video/mp2t")
+                else:
+                    self.send_body(404, "Not Found", "text/plain")
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeHLSHandler
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Twitch playback access token, usher master playlists and HLS media playlists.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--target-duration", type=int, default=2, help="Seconds between new segments")
+    parser.add_argument("--live", nargs="+", default=[], help="Streamer logins that have a stream")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parseargs()
+    hls = FakeHLS(args.port, args.target_duration)
+    hls.live.update(login.lower() for login in args.live)
+
+    print("Fake HLS listening, point PresenceFarmer at it with these URLs:")
+    print(f"GQL_URL = {hls.gql_url}")
+    print(f"USHER_URL = {hls.usher_url}")
+    try:
+        hls.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,316 @@
+import time
+import logging
+
+from tabs import TabPool # Import browser tab pool
+from pfp import download_profile_image  # Import pfp download function
+from notification import send_notification # Import notification function
+from presence import PresenceFarmer # Import browserless farming backend
+from metrics import parse_started_at # Import Helix timestamp parser
+from state import StateStore, LIVE_NOTIFIED, FARMING, OFFLINE_PENDING, CLOSED # Import streamer state store
+
+class Farmer:
+    def __init__(self, config, auth, user_cache, streamer_list):
+        self.config = config
+        self.auth = auth
+        self.user_cache = user_cache
+        self.streamer_list = streamer_list
+
+        # Managed browser tabs, limited to max_tabs at the same time
+        self.tabs = TabPool(
+            config.get('max_tabs', 4), config.get('browser_debugging_port'), config.get('browser_user_data_dir'), config.get('claim_bonus_chests', True),
+            config.get('farm_tab_profile', 'minimal'), config.get('farm_tab_cpu_throttling', 4), config.get('farm_tab_blocked_urls', [])
+        )
+        self.presence = None  # Browserless farming backend, started when first needed
+        self.next_tab_report_time = time.time()
+        self.tab_report = {}  # Streamer login to the CPU percent and JavaScript heap of its tab at the last report
+        self.next_claim_report_time = time.time()
+        self.store = StateStore()  # State of every streamer, by login and by window handle
+        self.external_closed_warning = False
+        self.first_check_done = False
+        self.metrics = None  # Records detection latencies when metrics are enabled
+        self.history = None  # Session history, continues sessions from before a restart when set
+        self.idle = False  # Whether the user was idle at the last check or idle change
+
+        # The tabs of farmed streamers are gone when the browser is launched or attached again
+        self.tabs.on_reset = self.reset_browser_streamers
+
+        # Profile image downloads and notifications, both are queued for background workers
+        self.download_profile_image = download_profile_image
+        self.send_notification = send_notification
+
+    def get_backend(self, streamer_login):
+        # Farming backend from the streamer list ("farm=hls"), or the default from the config
+        return self.streamer_list.get_option(streamer_login, 'farm', self.config.get('farming_backend', 'browser'))
+
+    def get_priority(self, streamer_login):
+        # Priority from the streamer list ("priority=5"), higher priorities get a browser tab first
+        try:
+            return int(self.streamer_list.get_option(streamer_login, 'priority', 0))
+        except ValueError:
+            return 0
+
+    def get_replaceable_streamer(self, streamer_login):
+        farmed_streamers = [streamer for streamer in self.store.in_state(FARMING) if streamer.backend == "browser"]
+        if not farmed_streamers:
+            return None
+
+        # Replace the lowest priority streamer if it has a lower priority, or an equal priority and has been farmed for a while
+        lowest = min(farmed_streamers, key=lambda streamer: (self.get_priority(streamer.login), streamer.farming_since))
+        priority = self.get_priority(streamer_login)
+        lowest_priority = self.get_priority(lowest.login)
+        rotation_interval = self.config.get('tab_rotation_interval', 30 * 60)
+
+        if lowest_priority < priority:
+            return lowest
+        if lowest_priority == priority and rotation_interval and time.time() - lowest.farming_since >= rotation_interval:
+            return lowest
+        return None
+
+    def start_farming(self, streamer_login):
+        if self.get_backend(streamer_login) == "hls":
+            # Keep a viewer presence by fetching the lowest rendition playlist, without a browser
+            if not self.presence:
+                self.presence = PresenceFarmer(self.config.get('hls_fetch_segments', False))
+            self.presence.start(streamer_login)
+            self.store.transition(streamer_login, FARMING, backend="hls")
+        else:
+            # Open or reuse a managed browser tab, up to the tab limit
+            window_handle = self.tabs.open(streamer_login)
+
+            # All tabs are in use, take over the tab of another streamer if this streamer has priority
+            if not window_handle:
+                replaced_streamer = self.get_replaceable_streamer(streamer_login)
+                if not replaced_streamer:
+                    if not self.store.get(streamer_login).is_live():
+                        logging.info(f"All {self.tabs.max_tabs} tabs are in use, {streamer_login} will be farmed when a tab is free.")
+                    self.store.transition(streamer_login, LIVE_NOTIFIED)
+                    return
+
+                window_handle = replaced_streamer.window_handle
+                logging.info(f"All {self.tabs.max_tabs} tabs are in use, switching the tab of {replaced_streamer.login} to {streamer_login}.")
+                self.store.transition(replaced_streamer.login, LIVE_NOTIFIED)
+
+                # The user may have closed the tab, its slot is free then
+                if not self.tabs.navigate(window_handle, streamer_login):
+                    window_handle = self.tabs.open(streamer_login)
+                    if not window_handle:
+                        self.store.transition(streamer_login, LIVE_NOTIFIED)
+                        return
+
+            self.store.transition(streamer_login, FARMING, window_handle, backend="browser")
+
+        self.store.get(streamer_login).farming_since = time.time()
+
+    def reset_browser_streamers(self):
+        # Streamers farmed in the tabs of the last browser get a new tab when they are started again
+        reset_streamers = [streamer for streamer in self.store.in_state(FARMING, OFFLINE_PENDING) if streamer.backend == "browser"]
+        for streamer in reset_streamers:
+            self.store.transition(streamer.login, LIVE_NOTIFIED)
+        if reset_streamers:
+            logging.info(f"The browser was restarted, {len(reset_streamers)} streamers will be farmed in new tabs.")
+
+    def get_waiting_streamers(self):
+        # Live streamers that aren't farmed, highest priority first
+        return sorted(self.store.in_state(LIVE_NOTIFIED), key=lambda streamer: self.get_priority(streamer.login), reverse=True)
+
+    def fill_free_tabs(self):
+        # Give tabs that were freed to the waiting streamers with the highest priority, instead of the next streamer that is checked
+        if not self.idle or not self.config.get('autofarming'):
+            return
+        for streamer in self.get_waiting_streamers():
+            if not self.tabs.has_free_slot():
+                break
+            if self.get_backend(streamer.login) == "browser":
+                self.start_farming(streamer.login)
+
+    def report_tab_resources(self):
+        # Log the CPU and memory used by every tab once in a while
+        if time.time() < self.next_tab_report_time or not self.tabs.used_tabs:
+            return
+        self.next_tab_report_time = time.time() + self.config.get('tab_report_interval', self.config.get('tab_memory_report_interval', 10 * 60))
+
+        self.tab_report = self.tabs.get_resource_report()
+        entries = []
+        for streamer_login, (cpu_percent, heap_size) in self.tab_report.items():
+            cpu = f"{cpu_percent:.1f}%" if cpu_percent is not None else "unknown"
+            heap = f"{heap_size / 1024 / 1024:.0f} MB" if heap_size else "unknown"
+            entries.append(f"{streamer_login}: {cpu} CPU, {heap} heap")
+        report = ", ".join(entries)
+        logging.info(f"Tab resources (main thread CPU, JavaScript heap): {report}")
+
+    def report_claims(self):
+        # Collect the bonus chests claimed inside the tabs once in a while
+        if time.time() < self.next_claim_report_time or not (self.tabs.used_tabs or self.tabs.released_claims):
+            return
+        self.next_claim_report_time = time.time() + self.config.get('claim_report_interval', 5 * 60)
+
+        claims = self.tabs.collect_claims()
+        if claims:
+            report = ", ".join(f"{streamer_login}: {claimed}" for streamer_login, claimed in claims.items())
+            logging.info(f"Claimed {sum(claims.values())} bonus chests: {report}")
+            if self.metrics:
+                self.metrics.record_claims(claims)
+
+    def update_streamers(self, streamers, live_streams, idle_duration):
+        self.idle = idle_duration > self.config.get('max_idle_duration')
+
+        # Loop through all streamers that were checked, highest priority first so they get the free tabs
+        for streamer_login in sorted(streamers, key=self.get_priority, reverse=True):
+            # Get relevant stream data if the streamer is live
+            stream = live_streams.get(streamer_login.lower())
+
+            if stream:
+                # Get cached user info to download profile image
+                user_info = self.user_cache.get(streamer_login)
+
+                self.streamer_live(streamer_login, stream, user_info, idle_duration)
+            else:
+                self.streamer_offline(streamer_login)
+
+        # Tabs from before a restart are closed if their streamer was found offline, live streamers took theirs over
+        if self.tabs.adopted_tabs:
+            self.tabs.release_adopted([streamer_login for streamer_login in streamers if streamer_login in self.tabs.adopted_tabs])
+
+        # Log the first completed check once, startup benchmarks wait for this line
+        if not self.first_check_done:
+            self.first_check_done = True
+            logging.info("First check complete!")
+
+            # Channels that aren't in the streamer list were opened by the user, leave their tabs alone
+            for streamer_login in list(self.tabs.adopted_tabs):
+                if streamer_login not in self.streamer_list.streamer_set:
+                    del self.tabs.adopted_tabs[streamer_login]
+
+        if self.history:
+            self.history.touch()
+        self.report_tab_resources()
+        self.report_claims()
+
+    def streamer_live(self, streamer_login, stream, user_info, idle_duration):
+        if user_info:
+            self.download_profile_image(user_info)
+
+        streamer = self.store.get(streamer_login)
+
+        # If the streamer was missing from the live streams last time, they are back live
+        if streamer.state == OFFLINE_PENDING:
+            self.store.transition(streamer_login, FARMING if streamer.backend else LIVE_NOTIFIED)
+
+        # If not already being farmed
+        if streamer.state != FARMING:
+            resumed_session = None
+
+            # If not already known to be live, log that the streamer is now live
+            if not streamer.is_live():
+                streamer.started_at = parse_started_at(stream.get("started_at"))
+
+                # Continue the session from before a restart if it's still the same stream
+                resumed_session = self.history.resume(streamer_login, stream) if self.history else None
+                if resumed_session:
+                    logging.info(f"{streamer_login} is still live, continuing the session from before the restart.")
+                else:
+                    logging.info(f"{streamer_login} is live!")
+                    if self.metrics:
+                        self.metrics.record_detection(stream)
+
+            # If the computer is considered "idle", start farming. A tab from before a restart keeps farming the streamer
+            # while they are still live, also when the user isn't idle, instead of being closed
+            idle = idle_duration > self.config.get('max_idle_duration')
+            adopted = streamer_login in self.tabs.adopted_tabs and self.get_backend(streamer_login) == "browser"
+            if (idle and self.config.get('autofarming')) or adopted:
+                self.start_farming(streamer_login)
+            else:
+                self.store.transition(streamer_login, LIVE_NOTIFIED)
+
+            # Going live starts the live time and notification over, keep them for a continued session
+            if resumed_session:
+                streamer.live_since = resumed_session["live_since"]
+                streamer.notification_sent = resumed_session["notified"]
+
+            # If the computer is not considered "idle", and a notification has not been sent already
+            if not idle:
+                # If notifications are enabled, send a non-intrusive notification to user
+                if not streamer.notification_sent and self.config.get('notification') and user_info:
+                    self.send_notification(user_info, stream['title'])
+                streamer.notification_sent = True
+
+        # If already open in managed browser window
+        elif streamer.backend == "browser":
+            # Switch to streamer tab in managed browser, and open it again if the user closed it
+            if self.tabs.is_open():
+                if not self.tabs.switch_to(streamer.window_handle):
+                    logging.info(f"The tab of {streamer_login} was closed, opening it again.")
+                    self.store.transition(streamer_login, LIVE_NOTIFIED)
+                    self.start_farming(streamer_login)
+            else:
+                if not self.external_closed_warning:
+                    logging.warning("Browser has been closed externally!")
+                    self.external_closed_warning = True
+
+        # If already farmed without a browser, make sure the presence is still running
+        elif not self.presence.is_farming(streamer_login):
+            self.presence.start(streamer_login)
+
+    def set_idle(self, idle):
+        self.idle = idle
+
+        # Farm the streamers that are already live as soon as the user goes idle, instead of at their next check
+        if idle and self.config.get('autofarming'):
+            for streamer in self.get_waiting_streamers():
+                self.start_farming(streamer.login)
+
+        # Stop farming when the user comes back, if enabled in the config, also for streamers pending offline that still have a tab
+        elif not idle and self.config.get('pause_farming_when_active'):
+            farmed_streamers = [streamer for streamer in self.store.in_state(FARMING, OFFLINE_PENDING) if streamer.backend]
+            for streamer in farmed_streamers:
+                self.stop_farming(streamer)
+                self.store.transition(streamer.login, LIVE_NOTIFIED)
+            if farmed_streamers:
+                logging.info(f"Paused farming {len(farmed_streamers)} streamers while the user is active.")
+
+    def stop_farming(self, streamer):
+        if streamer.backend == "hls":
+            self.presence.stop(streamer.login)
+        elif streamer.window_handle:
+            self.tabs.release(streamer.window_handle)
+
+    def remove_streamers(self, streamer_logins):
+        # Forget streamers that were removed from the streamer list, closing their tabs
+        for streamer_login in streamer_logins:
+            streamer = self.store.remove(streamer_login)
+
+            if streamer and streamer.is_live():
+                logging.info(f"{streamer_login} was removed from the streamer list.")
+                self.stop_farming(streamer)
+                if self.history:
+                    self.history.end_session(streamer_login)
+
+        # Tabs from before a restart aren't farmed anymore once their streamer is removed
+        if self.tabs.adopted_tabs:
+            self.tabs.release_adopted(streamer_logins)
+        self.fill_free_tabs()
+
+    def streamer_offline(self, streamer_login):
+        streamer = self.store.find(streamer_login)
+
+        # A session from before a restart ended while the script wasn't running
+        if self.history and not (streamer and streamer.is_live()):
+            self.history.discard(streamer_login)
+
+        if streamer and streamer.is_live():
+            # A streamer is only offline after missing from offline_confirm_checks checks in a row, counting the first miss,
+            # so a short dropout doesn't close the tab
+            if streamer.state != OFFLINE_PENDING:
+                self.store.transition(streamer_login, OFFLINE_PENDING)
+            streamer.offline_checks += 1
+
+            if streamer.offline_checks < self.config.get('offline_confirm_checks', 2):
+                if streamer.offline_checks == 1:
+                    logging.info(f"Stream not found for {streamer_login}, checking again shortly!")
+                return
+
+            logging.info(f"{streamer_login} is not live.")
+
+            self.stop_farming(streamer)
+            self.store.transition(streamer_login, CLOSED)
+            self.fill_free_tabs()
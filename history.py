@@ -0,0 +1,178 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from state import LIVE_NOTIFIED, FARMING, CLOSED, LIVE_STATES # Import streamer states
+from metrics import parse_started_at # Import Helix timestamp parser
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    login TEXT NOT NULL,
+    live_since REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    ended_at REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_login_time ON sessions (login, live_since);
+CREATE INDEX IF NOT EXISTS sessions_open ON sessions (ended_at) WHERE ended_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES sessions (id),
+    login TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_login_time ON notifications (login, sent_at);
+CREATE INDEX IF NOT EXISTS notifications_session ON notifications (session_id);
+
+CREATE TABLE IF NOT EXISTS farming (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES sessions (id),
+    login TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL
+);
+CREATE INDEX IF NOT EXISTS farming_login_time ON farming (login, started_at);
+"""
+
+class SessionHistory:
+    TOUCH_INTERVAL = 30  # Seconds between last_seen updates of the open sessions
+    RESUME_GRACE = 5 * 60  # A stream that started this long after the last sighting is a new session
+
+    def __init__(self, filename="history.db", readonly=False):
+        self.lock = threading.Lock()
+
+        if readonly and os.path.exists(filename):
+            # Only reads, so printing the history while a farmer is running leaves the open sessions of that farmer alone
+            self.connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            # Written from the farming thread, read from the main thread at startup
+            self.connection = sqlite3.connect(filename if not readonly else ":memory:", check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+
+        self.sessions = {}  # Streamer login to its open session id
+        self.farming = {}  # Streamer login to its open farming interval id
+        self.resumable = {}  # Streamer login to the session that was open when the script stopped
+        self.next_touch_time = 0
+
+        # Only the farmer's own startup ends the farming intervals of the last run
+        if not readonly:
+            self.load()
+
+    def load(self):
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT s.id, s.login, s.live_since, s.last_seen, EXISTS (SELECT 1 FROM notifications n WHERE n.session_id = s.id) "
+                "FROM sessions s WHERE s.ended_at IS NULL"
+            ).fetchall()
+
+            # The tabs and playlists of the last run are gone, so its farming intervals end at the last sighting
+            self.connection.execute(
+                "UPDATE farming SET ended_at = MAX(started_at, COALESCE((SELECT last_seen FROM sessions WHERE sessions.id = farming.session_id), started_at)) WHERE ended_at IS NULL"
+            )
+
+        for session_id, streamer_login, live_since, last_seen, notified in rows:
+            self.resumable[streamer_login] = {"session_id": session_id, "live_since": live_since, "last_seen": last_seen, "notified": bool(notified)}
+
+        if self.resumable:
+            logging.info(f"Found {len(self.resumable)} live sessions from the last run")
+
+    def resume(self, streamer_login, stream):
+        # Returns the session from before the restart if the stream is the same one, otherwise ends it
+        session = self.resumable.pop(streamer_login, None)
+        if not session:
+            return None
+
+        started_at = parse_started_at(stream.get("started_at"))
+        if started_at is not None and started_at > session["last_seen"] + self.RESUME_GRACE:
+            self.end_resumable(streamer_login, session)
+            return None
+
+        self.sessions[streamer_login] = session["session_id"]
+        return session
+
+    def discard(self, streamer_login):
+        # The streamer was found offline, end the session from before the restart at its last sighting
+        session = self.resumable.pop(streamer_login, None)
+        if session:
+            self.end_resumable(streamer_login, session)
+
+    def end_resumable(self, streamer_login, session):
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE sessions SET ended_at = ? WHERE id = ?", (session["last_seen"], session["session_id"]))
+
+    def on_transition(self, streamer, old_state, new_state):
+        now = time.time()
+        with self.lock, self.connection:
+            # Going live opens a session, unless a session from before a restart is continued
+            if new_state in (LIVE_NOTIFIED, FARMING) and old_state not in LIVE_STATES and streamer.login not in self.sessions:
+                cursor = self.connection.execute("INSERT INTO sessions (login, live_since, last_seen) VALUES (?, ?, ?)", (streamer.login, now, now))
+                self.sessions[streamer.login] = cursor.lastrowid
+
+            # Farming intervals last while the streamer has a tab or playlist, also while pending offline
+            if new_state == FARMING and streamer.login not in self.farming:
+                cursor = self.connection.execute(
+                    "INSERT INTO farming (session_id, login, backend, started_at) VALUES (?, ?, ?, ?)",
+                    (self.sessions.get(streamer.login), streamer.login, streamer.backend or "browser", now)
+                )
+                self.farming[streamer.login] = cursor.lastrowid
+            elif new_state in (LIVE_NOTIFIED, CLOSED) and streamer.login in self.farming:
+                self.connection.execute("UPDATE farming SET ended_at = ? WHERE id = ?", (now, self.farming.pop(streamer.login)))
+
+            # Confirmed offline, the session ended when the streamer was first missing
+            if new_state == CLOSED and streamer.login in self.sessions:
+                ended_at = streamer.offline_since or now
+                self.connection.execute("UPDATE sessions SET ended_at = ?, last_seen = MAX(last_seen, ?) WHERE id = ?", (ended_at, ended_at, self.sessions.pop(streamer.login)))
+
+    def end_session(self, streamer_login):
+        # The streamer was removed from the list while live
+        now = time.time()
+        with self.lock, self.connection:
+            if streamer_login in self.farming:
+                self.connection.execute("UPDATE farming SET ended_at = ? WHERE id = ?", (now, self.farming.pop(streamer_login)))
+            if streamer_login in self.sessions:
+                self.connection.execute("UPDATE sessions SET ended_at = ?, last_seen = ? WHERE id = ?", (now, now, self.sessions.pop(streamer_login)))
+
+    def record_notification(self, streamer_login):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO notifications (session_id, login, sent_at) VALUES (?, ?, ?)", (self.sessions.get(streamer_login), streamer_login, time.time()))
+
+    def touch(self):
+        # Remember when the open sessions were last seen live, so a restart knows where they ended
+        now = time.time()
+        if now < self.next_touch_time or not self.sessions:
+            return
+        self.next_touch_time = now + self.TOUCH_INTERVAL
+
+        with self.lock, self.connection:
+            self.connection.executemany("UPDATE sessions SET last_seen = ? WHERE id = ?", [(now, session_id) for session_id in self.sessions.values()])
+
+    def get_farming_hours(self, since=0):
+        # Farming hours, sessions and notifications per channel, most farmed first
+        now = time.time()
+        with self.lock:
+            return self.connection.execute(
+                "SELECT login, SUM(MIN(COALESCE(ended_at, ?), ?) - MAX(started_at, ?)) / 3600.0 AS hours, "
+                "(SELECT COUNT(*) FROM sessions s WHERE s.login = f.login AND s.live_since >= ?), "
+                "(SELECT COUNT(*) FROM notifications n WHERE n.login = f.login AND n.sent_at >= ?) "
+                "FROM farming f WHERE COALESCE(ended_at, ?) >= ? GROUP BY login ORDER BY hours DESC",
+                (now, now, since, since, since, now, since)
+            ).fetchall()
+
+    def print_history(self, days=None):
+        since = time.time() - days * 24 * 60 * 60 if days else 0
+        rows = self.get_farming_hours(since)
+        period = f"the last {days} days" if days else "all time"
+
+        if not rows:
+            print(f"No farming has been recorded for {period}.")
+            return
+
+        print(f"Farming hours per channel, {period}:")
+        for streamer_login, hours, sessions, notifications in rows:
+            print(f"{streamer_login}: {hours:.1f} hours farmed, {sessions} live sessions, {notifications} notifications")
@@ -1,5 +1,12 @@
+import os
+import sys
+import time
+import shutil
 import logging
-from ctypes import Structure, windll, c_uint, sizeof, byref
+import threading
+import subprocess
+import ctypes.util
+from ctypes import Structure, CDLL, POINTER, c_uint, c_int, c_ulong, c_void_p, sizeof, byref
 
 class LASTINPUTINFO(Structure):
     _fields_ = [
@@ -7,11 +14,185 @@ class LASTINPUTINFO(Structure):
         ('dwTime', c_uint),
     ]
 
-# Function to check user inactivity on Windows
+class XScreenSaverInfo(Structure):
+    _fields_ = [
+        ('window', c_ulong),
+        ('state', c_int),
+        ('kind', c_int),
+        ('til_or_since', c_ulong),
+        ('idle', c_ulong),
+        ('eventMask', c_ulong),
+    ]
+
+# User inactivity on Windows, from the time of the last keyboard or mouse input
+class WindowsIdleProvider:
+    def __init__(self):
+        from ctypes import windll
+        self.user32 = windll.user32
+        self.kernel32 = windll.kernel32
+
+    def get_idle_duration(self):
+        lastInputInfo = LASTINPUTINFO()
+        lastInputInfo.cbSize = sizeof(lastInputInfo)
+        self.user32.GetLastInputInfo(byref(lastInputInfo))
+
+        # The tick count wraps around after 49 days
+        millis = (self.kernel32.GetTickCount() - lastInputInfo.dwTime) & 0xFFFFFFFF
+        return millis / 1000.0
+
+# User inactivity on X11, through the XScreenSaver extension
+class X11IdleProvider:
+    def __init__(self):
+        xlib_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if not xlib_path or not xss_path:
+            raise OSError("libX11 or libXss is not installed")
+
+        self.xlib = CDLL(xlib_path)
+        self.xss = CDLL(xss_path)
+        self.xlib.XOpenDisplay.restype = c_void_p
+        self.xlib.XDefaultRootWindow.argtypes = [c_void_p]
+        self.xlib.XDefaultRootWindow.restype = c_ulong
+        self.xss.XScreenSaverAllocInfo.restype = POINTER(XScreenSaverInfo)
+        self.xss.XScreenSaverQueryInfo.argtypes = [c_void_p, c_ulong, POINTER(XScreenSaverInfo)]
+
+        self.display = self.xlib.XOpenDisplay(None)
+        if not self.display:
+            raise OSError("Could not open the X display")
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.info = self.xss.XScreenSaverAllocInfo()
+
+        # Xlib connections can't be used from several threads at once
+        self.lock = threading.Lock()
+
+    def get_idle_duration(self):
+        with self.lock:
+            if not self.xss.XScreenSaverQueryInfo(self.display, self.root, self.info):
+                return 0.0
+            return self.info.contents.idle / 1000.0
+
+# User inactivity from systemd-logind, the desktop sets the idle hint after its own idle timeout
+class LogindIdleProvider:
+    def __init__(self, session_id=None):
+        if not shutil.which("loginctl"):
+            raise OSError("loginctl is not available")
+        self.session_id = session_id or os.getenv("XDG_SESSION_ID") or "auto"
+
+    def get_idle_duration(self):
+        try:
+            output = subprocess.run(
+                ["loginctl", "show-session", self.session_id, "-p", "IdleHint", "-p", "IdleSinceHint"],
+                capture_output=True, text=True, timeout=5
+            ).stdout
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.error(f"Could not get the idle hint from logind: {str(e)}")
+            return 0.0
+
+        values = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+        if values.get("IdleHint") != "yes":
+            return 0.0
+
+        # IdleSinceHint is in microseconds since the epoch
+        idle_since = int(values.get("IdleSinceHint") or 0) / 1000000
+        return max(time.time() - idle_since, 0.0) if idle_since else 0.0
+
+# Inactivity that is set by hand, for tests and machines without idle detection
+class FakeIdleProvider:
+    def __init__(self, idle_duration=0):
+        self.set_idle_duration(idle_duration)
+
+    def set_idle_duration(self, idle_duration):
+        self.idle_since = time.time() - idle_duration
+
+    def get_idle_duration(self):
+        return time.time() - self.idle_since
+
+PROVIDERS = {
+    "windows": WindowsIdleProvider,
+    "x11": X11IdleProvider,
+    "logind": LogindIdleProvider,
+    "fake": FakeIdleProvider,
+}
+
+def create_provider(name="auto"):
+    if name != "auto":
+        return PROVIDERS[name]()
+
+    # Pick the provider of the platform, falling back to the next one if it isn't available
+    if sys.platform == "win32":
+        candidates = ["windows"]
+    elif os.getenv("DISPLAY"):
+        candidates = ["x11", "logind"]
+    else:
+        candidates = ["logind"]
+
+    for candidate in candidates:
+        try:
+            return PROVIDERS[candidate]()
+        except (OSError, ImportError) as e:
+            logging.warning(f"{candidate} idle detection is not available: {str(e)}")
+
+    logging.warning("No idle detection is available, the user is always considered active!")
+    return FakeIdleProvider()
+
+shared_provider = None
+provider_lock = threading.Lock()
+
+def setup_idle_provider(name="auto"):
+    global shared_provider
+
+    with provider_lock:
+        shared_provider = create_provider(name)
+    return shared_provider
+
+def get_provider():
+    global shared_provider
+
+    with provider_lock:
+        if shared_provider is None:
+            shared_provider = create_provider()
+    return shared_provider
+
+# Function to check user inactivity
 def check_idle_duration():
-    lastInputInfo = LASTINPUTINFO()
-    lastInputInfo.cbSize = sizeof(lastInputInfo)
-    windll.user32.GetLastInputInfo(byref(lastInputInfo))
-    millis = windll.kernel32.GetTickCount() - lastInputInfo.dwTime
-    logging.debug(millis / 1000.0)
-    return millis / 1000.0
\ No newline at end of file
+    return get_provider().get_idle_duration()
+
+class IdleMonitor:
+    RETURN_CHECK_INTERVAL = 5  # Seconds between checks for the user coming back while idle
+
+    def __init__(self, provider, max_idle_duration):
+        self.provider = provider
+        self.max_idle_duration = max_idle_duration
+        self.idle = False
+        self.changed = threading.Event()  # Set whenever the user goes idle or comes back
+        self.on_change = None  # Optional callback to wake up the main loop on a change
+
+    def start(self):
+        threading.Thread(target=self.run, name="idle", daemon=True).start()
+
+    def run(self):
+        while True:
+            # Keep the last state if the provider fails, and try again shortly instead of stopping idle detection for good
+            try:
+                idle_duration = self.provider.get_idle_duration()
+            except Exception as e:
+                logging.error(f"Could not get the idle duration: {str(e)}")
+                time.sleep(self.RETURN_CHECK_INTERVAL)
+                continue
+            idle = idle_duration > self.max_idle_duration
+
+            if idle != self.idle:
+                self.idle = idle
+                logging.info("User is idle, farming live streamers." if idle else "User is back.")
+                self.changed.set()
+                if self.on_change:
+                    try:
+                        self.on_change()
+                    except Exception:
+                        logging.exception("Error while reporting an idle change!")
+
+            # While active, the user can't become idle before the idle duration is reached, so there is nothing to check until then
+            if idle:
+                time.sleep(self.RETURN_CHECK_INTERVAL)
+            else:
+                time.sleep(self.max_idle_duration - idle_duration + 1)
@@ -1,46 +1,96 @@
 import os
 import glob
-from datetime import datetime
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
 import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-def get_timestamp():
-    return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line, for tools that parse the logs
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        return json.dumps(entry)
 
-def setup_logging():
-    logs_folder = "logs"
-    if not os.path.exists(logs_folder):
-        os.makedirs(logs_folder)
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    # Rotates when the log gets too big or too old, and gzips the rotated logs
+    def __init__(self, filename, max_bytes, backup_count, max_age):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.max_age = max_age
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self.compress
+
+        # A log left over from an old run is rotated on the first record if it's already too old
+        last_write = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self.rollover_at = min(last_write, time.time()) + max_age
 
-    # Remove older log files, keeping only the two most recent ones
-    existing_logs = sorted(glob.glob(os.path.join(logs_folder, "log-*.log")), key=os.path.getctime, reverse=True)
-    logs_to_keep = existing_logs[:2]
+    def compress(self, source, destination):
+        with open(source, 'rb') as source_file, gzip.open(destination, 'wb') as destination_file:
+            shutil.copyfileobj(source_file, destination_file)
+        os.remove(source)
 
-    for log_file in existing_logs:
-        if log_file not in logs_to_keep:
-            os.remove(log_file)
+    def shouldRollover(self, record):
+        if time.time() >= self.rollover_at and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
 
-    log_filename = f"log-{get_timestamp()}.log"
-    log_filepath = os.path.join(logs_folder, log_filename)
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.max_age
+
+def migrate_old_logs(log_path, backup_count):
+    # Logs from before the rotating log file were one file per run, move them into the rotated logs once, newest first,
+    # so they are compressed and pruned like the rest
+    old_logs = sorted(glob.glob(os.path.join(os.path.dirname(log_path), "log-*.log")), key=os.path.getmtime, reverse=True)
+    for index, old_log in enumerate(old_logs, start=1):
+        try:
+            rotated_log = f"{log_path}.{index}.gz"
+            if index <= backup_count and not os.path.exists(rotated_log):
+                with open(old_log, 'rb') as source_file, gzip.open(rotated_log, 'wb') as destination_file:
+                    shutil.copyfileobj(source_file, destination_file)
+            os.remove(old_log)
+        except OSError:
+            pass
+
+def setup_logging(log_format="text", log_file="farmer.log", max_bytes=5 * 1024 * 1024, backup_count=5, max_age=24 * 60 * 60):
+    logs_folder = "logs"
+    if not os.path.exists(logs_folder):
+        os.makedirs(logs_folder)
+    migrate_old_logs(os.path.join(logs_folder, log_file), backup_count)
 
     # Create a logger object
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
-    # Create file handler
-    file_handler = logging.FileHandler(log_filepath)
+    # Create file handler, rotated by size and age
+    file_handler = CompressingRotatingFileHandler(os.path.join(logs_folder, log_file), max_bytes, backup_count, max_age)
     file_handler.setLevel(logging.INFO)
 
     # Create console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
 
-    # Create a formatter and set it for both handlers
+    # Create a formatter and set it for both handlers, the log file can be JSON lines instead
     formatter = logging.Formatter("[%(asctime)s] (%(levelname)s): %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else formatter)
     console_handler.setFormatter(formatter)
 
-    # Add the handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Records only go into a queue on the logging thread, a background listener writes them to the file and console
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+
+    # Write out the records that are still queued when the script exits
+    atexit.register(listener.stop)
 
     return logger
@@ -4,35 +4,29 @@ import time
 import logging
 import msvcrt
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 
-from browser import init_browser, check_browser_open  # Import browser functions
 from logging_handler import setup_logging  # Import logging function
-from twitchauth import TwitchAuth  # Import TwitchAuth class
-from setup import first_time_setup, check_and_load_config, check_streamers_list, check_env_vars # Import setup functions
-from pfp import download_profile_image  # Import pfp download function
-from idle import check_idle_duration # Import idle detection functions
-from notification import send_notification # Import notification function
-from streamers import read_streamers_from_file # Import list reading functions
+from twitchauth import TwitchAuth, get_minimum_check_interval  # Import TwitchAuth class and interval helper
+from setup import first_time_setup, check_streamers_list, check_env_vars # Import setup functions
+from idle import check_idle_duration, setup_idle_provider, IdleMonitor # Import idle detection functions
+from streamers import StreamerList # Import streamer list loader
 from argparser import parseargs # Import arg check function
-
-def stream_open(streamer_login):
-    global driver
-    global first_time_run
-
-    if not first_time_run:
-        driver.switch_to.new_window('tab')
-    driver.get(f"https://www.twitch.tv/{streamer_login}")
-    first_time_run = False
-    return driver.current_window_handle
-
-def check_stream_status():
-    global driver
-    global first_time_run
-
+from farmer import Farmer # Import Farmer class
+from engine import AsyncEngine # Import async monitoring engine
+from usercache import UserCache # Import user info cache
+from scheduler import PollScheduler # Import poll scheduler
+from schedules import StreamerSchedules # Import learned streamer schedules
+from metrics import Metrics # Import metrics endpoint
+from poller import PollerClient # Import poller client
+from history import SessionHistory # Import session history store
+from notification import setup_notifications # Import notification dispatcher setup
+
+def validate_check_interval():
     check_interval = config.get('check_interval')
 
     # Check if the interval is too small, avoid spamming Twitch servers as well as giving browser tabs time to load.
-    minimum_check_interval = len(read_streamers_from_file(config.get('active_list'))) * 5
+    minimum_check_interval = get_minimum_check_interval(len(streamer_list.streamers))
     if check_interval < 15:
         logging.error("Interval has to be equal to or more than 15!")
         print("Press any key to continue...")
@@ -44,154 +38,230 @@ def check_stream_status():
         msvcrt.getch()
         sys.exit()
 
-    next_check_time = time.time()
-    live_streamers = []  # List of dictionaries containing streamer info
-    recently_offline_streamers = []
-    external_closed_warning = False
+def check_stream_status():
+    check_interval = config.get('check_interval')
+
+    # Check every streamer in the list right away
+    scheduler.add_streamers(streamer_list.streamers)
+    next_list_check_time = time.time()
 
     while True:
         current_time = time.time()
 
-        # Check user inactivity
-        idle_duration = check_idle_duration()
-
-        if current_time >= next_check_time:
-            # Read streamer names from the streamer list
-            streamers = read_streamers_from_file(config.get('active_list'))
-
-            # Loop through all streamers read from the streamer list
-            for streamer_login in streamers:
-                # Checks if a streamer is live, and gets relevant stream data
-                streams_data = auth.get_live_streams(user_login=streamer_login)
-
-                # If a streamer is live
-                if streams_data and streams_data.get("data"):
-                    # Get user info to download profile image
-                    user_info = auth.get_users_info(user_login=streamer_login)
-                    if user_info and user_info.get("data"):
-                        download_profile_image(user_info['data'][0])
-
-                    # Some black magic to find out if the streamer is already known to be live
-                    streamer_info = next((info for info in live_streamers if info['streamer_login'] == streamer_login), None)
-
-                    # If the streamer is known to be live, remove from recently offline streamers
-                    if streamer_info in recently_offline_streamers:
-                        recently_offline_streamers.remove(streamer_info)
-
-                    # If not already known to be live or not already open in managed browser window
-                    if not streamer_info or not streamer_info['open_in_browser']:
-                        # Get the stream title
-                        for stream in streams_data["data"]:
-                            stream_title = stream['title']
-                        
-                        # If not already known to be live, log that the streamer is now live
-                        if not streamer_info in live_streamers:
-                            logging.info(f"{streamer_login} is live!")
-
-                        # If the computer is considered "idle", and the streamer isn't already known to be live, and a browser tab has not already been opened
-                        if idle_duration > config.get('max_idle_duration'):
-                            if config.get('autofarming'):
-                                # Removing streamer from live streamers to re-add updated info later
-                                if streamer_info in live_streamers:
-                                    live_streamers.remove(streamer_info)
-
-                                # Open a managed browser window with tabs for each live streamer
-                                if not check_browser_open(driver):
-                                    first_time_run = True
-                                    driver = init_browser()
-                                current_window_handle = stream_open(streamer_login)
-                                live_streamers.append({'streamer_login': streamer_login, 'window_handle': current_window_handle, 'open_in_browser': True})
-                        
-                        # If the computer is not considered "idle", and the streamer isn't already known to be live, or a notification has not been sent already
-                        elif not streamer_info or not streamer_info['notification_sent']:
-                            # If notifications are enabled, send notification
-                            if config.get('notification'):
-                                # Removing streamer from live streamers to re-add updated info later
-                                if streamer_info in live_streamers:
-                                    live_streamers.remove(streamer_info)
-
-                                # Send a non-intrusive notification to user
-                                send_notification(user_info['data'][0], stream_title)
-
-                            live_streamers.append({'streamer_login': streamer_login, 'open_in_browser': False, 'notification_sent': True})
-
-                    # If already known to be live or already open in managed browser window
-                    else:
-                        stream_window = next((info['window_handle'] for info in live_streamers if info['streamer_login'] == streamer_login), None)
-
-                        # Switch to streamer tab in managed browser
-                        if check_browser_open(driver):
-                            driver.switch_to.window(stream_window)
-                        else:
-                            if not external_closed_warning:
-                                logging.warning("Browser has been closed externally!")
-                                external_closed_warning = True
-
-                # If a streamer is not live
-                else:
-                    streamer_info = next((info for info in live_streamers if info['streamer_login'] == streamer_login), None)
-
-                    if streamer_info:
-                        if streamer_info in recently_offline_streamers:
-                            logging.info(f"{streamer_login} is not live.")
-
-                            live_streamers.remove(streamer_info)
-
-                            stream_window = streamer_info['window_handle']
-
-                            if stream_window:
-                                try:
-                                    driver.switch_to.window(stream_window)
-                                    driver.close()
-                                    recently_offline_streamers.remove(streamer_info)
-                                except Exception:
-                                    logging.error(f"Could not close the tab for {streamer_login}!")
-                        else:
-                            logging.info(f"Stream not found for {streamer_login}, retrying in {check_interval} seconds!")
-
-                            recently_offline_streamers.append(streamer_info)
-
-            # Update the next check time
-            next_check_time = current_time + check_interval
-
-        # This allows the loop to avoid consuming too much CPU
-        time.sleep(1)
+        # Check the streamer list and the cached user info once every check interval
+        if current_time >= next_list_check_time:
+            # Read streamer names from the streamer list, if it changed
+            added, removed = streamer_list.reload()
+
+            # Forget streamers that were removed from the list, and check new streamers right away
+            if removed:
+                farmer.remove_streamers(removed)
+                scheduler.remove_streamers(removed)
+            if added:
+                scheduler.add_streamers(added)
+            if eventsub and (added or removed):
+                eventsub.set_streamers(streamer_list.streamers)
+
+            # Look up user info for new streamers and streamers whose cached info expired
+            user_cache.refresh(streamer_list.streamers)
+
+            next_list_check_time = current_time + check_interval
+
+        # Update the streamers covered by EventSub when it reports a change
+        if eventsub and eventsub.changed.is_set():
+            eventsub.changed.clear()
+            pushed_streamers = eventsub.split_streamers(streamer_list.streamers)[0]
+            farmer.update_streamers(pushed_streamers, eventsub.get_live_streams(), check_idle_duration())
+
+        # Start or pause farming right away when the user goes idle or comes back
+        if idle_monitor.changed.is_set():
+            idle_monitor.changed.clear()
+            farmer.set_idle(idle_monitor.idle)
+
+        # Get the streamers that are due to be checked
+        due_streamers = scheduler.pop_due_streamers()
+
+        # Streamers covered by EventSub are pushed, only the rest has to be polled
+        if eventsub:
+            pushed_streamers, due_streamers = eventsub.split_streamers(due_streamers)
+
+            # Due pushed streamers still get checked against the pushed live streams, so a streamer that went offline
+            # is confirmed after the offline pending check interval, instead of waiting for the next EventSub change
+            if pushed_streamers:
+                farmer.update_streamers(pushed_streamers, eventsub.get_live_streams(), check_idle_duration())
+                scheduler.reschedule_streamers(pushed_streamers)
+
+        if due_streamers:
+            cycle_start_time = time.monotonic()
+            idle_duration = check_idle_duration()
+
+            # Check which streamers are live, up to 100 streamers per request
+            live_streams = auth.get_live_streams_batch(user_logins=due_streamers)
+            if live_streams is None:
+                logging.warning(f"Could not check live streams, retrying in {check_interval} seconds!")
+                scheduler.reschedule_streamers(due_streamers, check_interval)
+            else:
+                farmer.update_streamers(due_streamers, live_streams, idle_duration)
+                scheduler.reschedule_streamers(due_streamers)
+
+            if metrics:
+                failed_count = len(due_streamers) if live_streams is None else 0
+                metrics.record_poll_cycle(time.monotonic() - cycle_start_time, len(due_streamers) - failed_count, failed_count, idle_duration)
+
+        # Sleep until the next streamer is due, the streamer list has to be checked, or something wakes the scheduler up
+        scheduler.wait(max(next_list_check_time - time.time(), 0))
+
+def check_poller_status():
+    check_interval = config.get('check_interval')
+
+    # Subscribe to every streamer in the list, the poller checks them and sends their status
+    poller_client.set_streamers(streamer_list.streamers)
+    poller_client.start()
+    next_list_check_time = time.time() + check_interval
+
+    while True:
+        # Check the streamer list once every check interval
+        if time.time() >= next_list_check_time:
+            added, removed = streamer_list.reload()
+            if removed:
+                farmer.remove_streamers(removed)
+            if added or removed:
+                poller_client.set_streamers(streamer_list.streamers)
+
+            next_list_check_time = time.time() + check_interval
+
+        # Wait for the poller to send the status of the streamers it checked
+        update = poller_client.get_update(max(next_list_check_time - time.time(), 0))
+
+        # Start or pause farming right away when the user goes idle or comes back
+        if idle_monitor.changed.is_set():
+            idle_monitor.changed.clear()
+            farmer.set_idle(idle_monitor.idle)
+
+        if update:
+            checked_streamers, live_streams = update
+            checked_streamers = [streamer_login for streamer_login in checked_streamers if streamer_login in streamer_list.streamer_set]
+            if checked_streamers:
+                farmer.update_streamers(checked_streamers, live_streams, check_idle_duration())
 
 if __name__ == "__main__":
     # Load environment variables from .env file
     load_dotenv()
 
     # Get relevant launch arguments
-    skip_intro = parseargs()
+    args = parseargs()
+
+    # Show the learned streamer schedules and exit
+    if args.show_schedules is not None:
+        StreamerSchedules().print_schedules(args.show_schedules)
+        sys.exit()
+
+    # Show the farming hours per channel and exit
+    if args.show_history is not None:
+        SessionHistory(readonly=True).print_history(args.show_history)
+        sys.exit()
 
     # Setup logging
-    logging = setup_logging()
+    logging = setup_logging(args.log_format)
 
-    # Load first time setup
-    first_time_setup(skip_intro)
+    # Load first time setup, which also loads the base config
+    config = first_time_setup(args.skip_intro, not args.poller)
 
-    # Check base config        
-    config = check_and_load_config()
+    # Check environment variables, the Twitch API credentials are only needed when checking Twitch directly
+    if not args.poller:
+        check_env_vars()
 
-    # Check environment variables
-    check_env_vars()
+    # Send notifications from a background worker, through the backends set in the config
+    dispatcher = setup_notifications(config)
 
     # Create an instance of TwitchAuth
-    auth = TwitchAuth(os.getenv("client_id"), os.getenv("client_secret"))
+    auth = TwitchAuth(os.getenv("client_id"), os.getenv("client_secret"), api_base_url=os.getenv("helix_api_base_url"), oauth_url=os.getenv("helix_oauth_url"))
 
-    # Authenticate to obtain the access token
-    auth.authenticate()
+    # Authenticate to obtain the access token in the background while everything else loads, reusing the cached token if it's still fresh
+    # Farmers that get their live status from a poller don't talk to Helix themselves
+    auth_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auth")
+    authentication = auth_executor.submit(auth.authenticate) if not args.poller else None
 
     # Check if streamers list exists
     streamers_file = config.get('active_list')
     check_streamers_list(streamers_file)
 
-    # Define global variables
-    driver = None
-    first_time_run = True
+    # Load the streamer list
+    streamer_list = StreamerList(streamers_file)
+    streamer_list.reload()
+
+    # Check if the interval is too small, the poller keeps to its own minimum
+    if not args.poller:
+        validate_check_interval()
+
+    # Load cached user info, refreshed through /users when it expires, or use the user info sent by the poller
+    poller_client = None
+    if args.poller:
+        poller_client = PollerClient(args.poller, os.getenv("poller_secret"))
+        user_cache = poller_client
+    else:
+        user_cache = UserCache(auth)
+
+    # Create the Farmer that keeps track of live streamers and browser tabs
+    farmer = Farmer(config, auth, user_cache, streamer_list)
+
+    # Learn when streamers usually go live from their go-live and go-offline history
+    schedules = StreamerSchedules()
+    farmer.store.listeners.append(schedules.on_transition)
+
+    # Record live sessions, notifications and farming, and continue the sessions that were live before a restart
+    history = SessionHistory()
+    farmer.history = history
+    farmer.store.listeners.append(history.on_transition)
+    dispatcher.on_sent = history.record_notification
+
+    # Create the scheduler that decides when each streamer is checked
+    scheduler = PollScheduler(config, farmer.store, schedules)
+
+    # Start EventSub to get pushed go-live/go-offline events, polling is used for everything it doesn't cover
+    eventsub = None
+    if args.eventsub and args.poller:
+        logging.warning("EventSub is not used when getting live status from a poller!")
+    elif args.eventsub:
+        if os.getenv("user_access_token"):
+            from eventsub import EventSubClient # Import EventSub client, only when EventSub is enabled
+            eventsub = EventSubClient(auth, user_cache, os.getenv("user_access_token"))
+            eventsub.set_streamers(streamer_list.streamers)
+            eventsub.on_change = scheduler.wake
+            eventsub.start()
+        else:
+            logging.warning("EventSub requires a user_access_token in .env, falling back to polling!")
+
+    # Expose metrics on localhost and/or in a periodic JSON snapshot, if enabled in the config
+    metrics = None
+    if config.get('metrics_port') or config.get('metrics_snapshot_interval'):
+        metrics = Metrics(config, auth, farmer)
+        farmer.metrics = metrics
+        metrics.start(config.get('metrics_port'), config.get('metrics_snapshot_interval'), config.get('metrics_snapshot_file', 'metrics.json'))
+
+    # Watch for the user going idle or coming back, and wake up the main loop when it happens
+    idle_monitor = IdleMonitor(setup_idle_provider(config.get('idle_provider', 'auto')), config.get('max_idle_duration'))
+    if args.poller:
+        idle_monitor.on_change = lambda: poller_client.updates.put(None)
+    else:
+        idle_monitor.on_change = scheduler.wake
+    idle_monitor.start()
+
+    # Take over the browser and its streamer tabs if it was left open by the last run, while Twitch is authenticating
+    farmer.tabs.attach()
+
+    # Wait for the authentication before the first check
+    if authentication and not authentication.result():
+        logging.error("Could not get an access token, will retry on the next check. Check client_id and client_secret in .env if this keeps happening!")
+    auth_executor.shutdown()
 
     # Script is ready
     logging.info("Script is ready!")
 
     # Start the loop to check if the streamer is live
-    check_stream_status()
+    if args.poller:
+        check_poller_status()
+    elif args.engine == "async":
+        AsyncEngine(config, auth, user_cache, streamer_list, farmer, scheduler, eventsub, metrics, idle_monitor).run()
+    else:
+        check_stream_status()
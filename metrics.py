@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def parse_started_at(started_at):
+    # Helix timestamps look like 2024-01-31T18:00:00Z
+    try:
+        return datetime.strptime(started_at, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+class Metrics:
+    PREFIX = "twitch_farmer"
+
+    def __init__(self, config, auth, farmer):
+        self.config = config
+        self.auth = auth
+        self.farmer = farmer
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+        self.poll_cycles = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0, "last_time": None}
+        self.checked_streamers = 0
+        self.failed_streamers = 0
+        self.detections = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0}
+        self.idle_duration = 0.0
+        self.bonus_claims = {}  # Streamer login to the bonus chests claimed in its tab
+
+    def record_poll_cycle(self, duration, checked_count, failed_count, idle_duration):
+        with self.lock:
+            self.poll_cycles["count"] += 1
+            self.poll_cycles["total_seconds"] += duration
+            self.poll_cycles["max_seconds"] = max(self.poll_cycles["max_seconds"], duration)
+            self.poll_cycles["last_seconds"] = duration
+            self.poll_cycles["last_time"] = time.time()
+            self.checked_streamers += checked_count
+            self.failed_streamers += failed_count
+            self.idle_duration = idle_duration
+
+    def record_detection(self, stream):
+        # Time between the stream starting and the farmer noticing it, streams that started before the script are skipped
+        started_at = parse_started_at(stream.get("started_at"))
+        if started_at is None or started_at < self.start_time:
+            return
+
+        latency = max(time.time() - started_at, 0)
+        with self.lock:
+            self.detections["count"] += 1
+            self.detections["total_seconds"] += latency
+            self.detections["max_seconds"] = max(self.detections["max_seconds"], latency)
+            self.detections["last_seconds"] = latency
+
+    def record_claims(self, claims):
+        with self.lock:
+            for streamer_login, claimed in claims.items():
+                self.bonus_claims[streamer_login] = self.bonus_claims.get(streamer_login, 0) + claimed
+
+    def get_snapshot(self):
+        transport_stats = self.auth.transport.get_stats()
+        with self.lock:
+            snapshot = {
+                "time": time.time(),
+                "uptime_seconds": time.time() - self.start_time,
+                "poll_cycles": dict(self.poll_cycles),
+                "checked_streamers": self.checked_streamers,
+                "failed_streamers": self.failed_streamers,
+                "detection_latency": dict(self.detections),
+                "idle_seconds": self.idle_duration,
+                "idle": self.idle_duration > self.config.get('max_idle_duration'),
+                "bonus_claims": dict(self.bonus_claims),
+            }
+
+        snapshot["streamers"] = self.farmer.store.count_states()
+        snapshot["open_tabs"] = len(self.farmer.tabs.used_tabs)
+        snapshot["tabs"] = {streamer_login: {"cpu_percent": cpu_percent, "js_heap_bytes": heap_size} for streamer_login, (cpu_percent, heap_size) in dict(self.farmer.tab_report).items()}
+        snapshot["hls_streams"] = len(self.farmer.presence.streams) if self.farmer.presence else 0
+        snapshot["token_expires_in_seconds"] = self.auth.tokens.expires_at - time.time() if self.auth.access_token else None
+        snapshot["endpoints"] = transport_stats["endpoints"]
+        snapshot["rate_limits"] = transport_stats["rate_limits"]
+        return snapshot
+
+    def render_prometheus(self):
+        snapshot = self.get_snapshot()
+        lines = []
+
+        def add(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {self.PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {self.PREFIX}_{name} {metric_type}")
+            for suffix, labels, value in samples:
+                if value is not None:
+                    lines.append(f"{self.PREFIX}_{name}{suffix}{format_labels(labels)} {float(value)}")
+
+        poll_cycles = snapshot["poll_cycles"]
+        add("poll_cycle_seconds", "summary", "Duration of poll cycles, from the first request to the farming update.", [("_count", None, poll_cycles["count"]), ("_sum", None, poll_cycles["total_seconds"])])
+        add("poll_cycle_max_seconds", "gauge", "Longest poll cycle.", [("", None, poll_cycles["max_seconds"])])
+        add("poll_cycle_last_seconds", "gauge", "Duration of the last poll cycle.", [("", None, poll_cycles["last_seconds"])])
+        add("checked_streamers_total", "counter", "Streamers checked through Helix.", [("", None, snapshot["checked_streamers"])])
+        add("failed_streamers_total", "counter", "Streamers whose check failed and was retried later.", [("", None, snapshot["failed_streamers"])])
+
+        detections = snapshot["detection_latency"]
+        add("detection_latency_seconds", "summary", "Time between a stream starting and the farmer detecting it.", [("_count", None, detections["count"]), ("_sum", None, detections["total_seconds"])])
+        add("detection_latency_max_seconds", "gauge", "Longest detection latency.", [("", None, detections["max_seconds"])])
+
+        endpoints = snapshot["endpoints"]
+        add("http_requests_total", "counter", "HTTP requests per endpoint, including retries.", [("", {"endpoint": endpoint}, stats["count"]) for endpoint, stats in endpoints.items()])
+        add("http_request_errors_total", "counter", "Failed HTTP requests per endpoint.", [("", {"endpoint": endpoint}, stats["errors"]) for endpoint, stats in endpoints.items()])
+        add("http_request_seconds", "summary", "HTTP request latency per endpoint.", [sample for endpoint, stats in endpoints.items() for sample in (("_count", {"endpoint": endpoint}, stats["count"]), ("_sum", {"endpoint": endpoint}, stats["total_seconds"]))])
+        add("http_request_max_seconds", "gauge", "Slowest HTTP request per endpoint.", [("", {"endpoint": endpoint}, stats["max_seconds"]) for endpoint, stats in endpoints.items()])
+
+        rate_limits = snapshot["rate_limits"]
+        add("rate_limit_remaining", "gauge", "Requests left in the rate limit bucket per host.", [("", {"host": host}, bucket["remaining"]) for host, bucket in rate_limits.items()])
+        add("rate_limit_capacity", "gauge", "Rate limit bucket size per host.", [("", {"host": host}, bucket["capacity"]) for host, bucket in rate_limits.items()])
+
+        add("streamers", "gauge", "Streamers per state.", [("", {"state": state}, count) for state, count in snapshot["streamers"].items()])
+        add("open_tabs", "gauge", "Browser tabs used for farming.", [("", None, snapshot["open_tabs"])])
+        add("bonus_claims_total", "counter", "Bonus chests claimed per streamer.", [("", {"streamer": streamer_login}, claimed) for streamer_login, claimed in snapshot["bonus_claims"].items()])
+        add("tab_cpu_percent", "gauge", "Main thread CPU used by the tab of a streamer at the last tab report, in percent of a core.", [("", {"streamer": streamer_login}, tab["cpu_percent"]) for streamer_login, tab in snapshot["tabs"].items()])
+        add("tab_js_heap_bytes", "gauge", "JavaScript heap of the tab of a streamer at the last tab report.", [("", {"streamer": streamer_login}, tab["js_heap_bytes"]) for streamer_login, tab in snapshot["tabs"].items()])
+        add("hls_streams", "gauge", "Streams farmed without a browser.", [("", None, snapshot["hls_streams"])])
+        add("idle_seconds", "gauge", "Seconds since the last user input.", [("", None, snapshot["idle_seconds"])])
+        add("idle", "gauge", "1 if the computer is considered idle.", [("", None, snapshot["idle"])])
+        add("token_expires_in_seconds", "gauge", "Seconds until the app access token expires.", [("", None, snapshot["token_expires_in_seconds"])])
+        add("uptime_seconds", "gauge", "Seconds since the script started.", [("", None, snapshot["uptime_seconds"])])
+
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, filename):
+        # Write to a temporary file first, so readers never see a half written snapshot
+        try:
+            temp_filename = f"{filename}.tmp"
+            with open(temp_filename, 'w') as file:
+                json.dump(self.get_snapshot(), file, indent=4)
+            os.replace(temp_filename, filename)
+        except OSError as e:
+            logging.error(f"Could not write {filename}: {str(e)}")
+
+    def start(self, port=None, snapshot_interval=None, snapshot_file="metrics.json"):
+        if port:
+            self.start_server(port)
+        if snapshot_interval:
+            threading.Thread(target=self.run_snapshots, args=(snapshot_interval, snapshot_file), name="metrics-snapshot", daemon=True).start()
+
+    def run_snapshots(self, snapshot_interval, snapshot_file):
+        while True:
+            time.sleep(snapshot_interval)
+            self.write_snapshot(snapshot_file)
+
+    def start_server(self, port):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.render_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.get_snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep scrapes out of the log file
+                pass
+
+        # Only listen on localhost, the metrics are not meant to be reachable from other machines
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        except OSError as e:
+            logging.error(f"Could not start the metrics endpoint on port {port}: {str(e)}")
+            return
+
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"Metrics available at http://127.0.0.1:{port}/metrics")
@@ -1,20 +1,193 @@
 import os
+import time
+import queue
 import logging
-from winotify import Notification
+import requests
+import threading
+
+from pfp import wait_for_profile_image  # Import pfp wait function
+from transport import get_transport  # Import shared HTTP transport
+
+APP_ID = "Twitch Channel Point Farmer 2.0"
+
+def get_summary(notifications):
+    # One line for a single go-live, a combined line when several streamers went live together
+    if len(notifications) == 1:
+        user_info, stream_title = notifications[0]
+        return f"{user_info['display_name']} is live! Go farm some points!", stream_title
+
+    names = [user_info['display_name'] for user_info, _ in notifications]
+    return f"{len(names)} streamers are live! Go farm some points!", ", ".join(names)
+
+class ToastBackend:
+    def send(self, notifications):
+        # Only load the notification backend once the first notification is sent, it slows down startup
+        from winotify import Notification
+
+        title, message = get_summary(notifications)
+
+        # A single streamer gets its profile image and a link to the channel, a summary links to the followed channels
+        if len(notifications) == 1:
+            streamer_login = notifications[0][0]['login']
+
+            # Give a running profile image download a moment to finish
+            wait_for_profile_image(streamer_login)
+
+            icon = os.path.abspath(f"pfp/profile_image_{streamer_login}.png")
+            launch = f"https://twitch.tv/{streamer_login}"
+        else:
+            icon = ""
+            launch = "https://twitch.tv/directory/following"
+
+        toast = Notification(app_id=APP_ID,
+                        title=title,
+                        msg=message,
+                        duration="short",
+                        icon=icon,
+                        launch=launch
+                        )
+        toast.show()
+        return True
+
+class WebhookBackend:
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, notifications):
+        # "content" is shown by Discord and similar chat webhooks, the streamers are there for other receivers
+        title, message = get_summary(notifications)
+        payload = {
+            "content": f"{title}\n{message}",
+            "streamers": [
+                {"login": user_info['login'], "display_name": user_info['display_name'], "title": stream_title, "url": f"https://twitch.tv/{user_info['login']}"}
+                for user_info, stream_title in notifications
+            ]
+        }
+
+        try:
+            response = get_transport().post(self.url, json=payload, endpoint="webhook")
+        except requests.exceptions.RequestException as e:
+            # The error message holds the webhook url, which carries the webhook token
+            logging.error(f"Failed to send the webhook notification: {type(e).__name__}")
+            return False
+
+        if response.status_code >= 400:
+            logging.error(f"Failed to send the webhook notification. Status code: {response.status_code}")
+            return False
+        return True
+
+class StdoutBackend:
+    def send(self, notifications):
+        title, message = get_summary(notifications)
+        print(f"{title} {message}", flush=True)
+        return True
+
+class NotificationDispatcher:
+    def __init__(self, backends, coalesce_window=3, throttle=10 * 60):
+        self.backends = backends
+        self.coalesce_window = coalesce_window  # Seconds to wait for more go-lives before notifying
+        self.throttle = throttle  # Seconds before the same streamer can notify again
+
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.last_sent = {}  # Streamer login to when a notification for it was last sent
+        self.pending = set()  # Streamer logins that are queued and not sent yet
+        self.worker = None
+        self.on_sent = None  # Optional callback with the login of every streamer in a notification that was sent
+
+    def notify(self, user_info, stream_title):
+        # Queue the notification for the worker, this never blocks
+        streamer_login = user_info['login']
+        with self.lock:
+            if streamer_login in self.pending:
+                return False
+            if time.time() - self.last_sent.get(streamer_login, 0) < self.throttle:
+                logging.info(f"Skipping the notification for {streamer_login}, it was notified less than {self.throttle} seconds ago")
+                return False
+            self.pending.add(streamer_login)
+
+            if not self.worker:
+                self.worker = threading.Thread(target=self.run, name="notifications", daemon=True)
+                self.worker.start()
+
+        self.queue.put((user_info, stream_title))
+        return True
+
+    def run(self):
+        while True:
+            # Collect the go-lives that come in shortly after the first one, so they end up in one notification
+            notifications = [self.queue.get()]
+            deadline = time.time() + self.coalesce_window
+            while time.time() < deadline:
+                try:
+                    notifications.append(self.queue.get(timeout=deadline - time.time()))
+                except queue.Empty:
+                    break
+
+            self.dispatch(notifications)
+
+    def dispatch(self, notifications):
+        # The notification counts as sent if at least one backend sent it
+        sent = False
+        for backend in self.backends:
+            try:
+                if backend.send(notifications):
+                    sent = True
+            except Exception:
+                logging.exception(f"Error while sending a notification with {type(backend).__name__}!")
+
+        # Only a notification that was sent throttles its streamers, a failed one can be sent again at the next go-live
+        streamer_logins = [user_info['login'] for user_info, _ in notifications]
+        with self.lock:
+            self.pending.difference_update(streamer_logins)
+            if sent:
+                for streamer_login in streamer_logins:
+                    self.last_sent[streamer_login] = time.time()
+
+        if not sent:
+            logging.warning(f"Could not send the notification for {', '.join(streamer_logins)} with any backend!")
+            return False
+
+        if len(notifications) == 1:
+            logging.info("Notification sent!")
+        else:
+            logging.info(f"Notification sent for {len(notifications)} streamers!")
+
+        if self.on_sent:
+            for streamer_login in streamer_logins:
+                self.on_sent(streamer_login)
+        return True
+
+shared_dispatcher = None
+dispatcher_lock = threading.Lock()
+
+def setup_notifications(config):
+    # Backends from the config, "toast" shows a desktop notification, "webhook" posts to notification_webhook_url, "stdout" prints
+    global shared_dispatcher
+
+    backends = []
+    for name in config.get('notification_backends', ["toast"]):
+        if name == "toast":
+            backends.append(ToastBackend())
+        elif name == "webhook" and config.get('notification_webhook_url'):
+            backends.append(WebhookBackend(config.get('notification_webhook_url')))
+        elif name == "stdout":
+            backends.append(StdoutBackend())
+        else:
+            logging.warning(f"Unknown or incomplete notification backend {name}, check notification_backends in config.json!")
+
+    with dispatcher_lock:
+        shared_dispatcher = NotificationDispatcher(backends, config.get('notification_coalesce_window', 3), config.get('notification_throttle', 10 * 60))
+    return shared_dispatcher
+
+def get_dispatcher():
+    global shared_dispatcher
+
+    with dispatcher_lock:
+        if shared_dispatcher is None:
+            shared_dispatcher = NotificationDispatcher([ToastBackend()])
+    return shared_dispatcher
 
 def send_notification(user_info, stream_title):
-    streamer_login = user_info['login']
-    streamer_name = user_info['display_name']
-
-    image_path = os.path.abspath(f"pfp/profile_image_{streamer_login}.png")
-    
-    toast = Notification(app_id="Twitch Channel Point Farmer 2.0",
-                    title=f"{streamer_name} is live! Go farm some points!",
-                    msg=f"{stream_title}",
-                    duration="short",
-                    icon=image_path,
-                    launch=f"https://twitch.tv/{streamer_login}"
-                    )
-    toast.show()
-
-    logging.info("Notification sent!")
\ No newline at end of file
+    # Returns False if the streamer was notified too recently or is already queued
+    return get_dispatcher().notify(user_info, stream_title)
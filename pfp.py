@@ -1,38 +1,129 @@
 import os
+import json
+import time
 import requests
 import logging
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def download_profile_image(user_info, pfp_folder="pfp"):
-    if not os.path.exists(pfp_folder):
-        os.makedirs(pfp_folder)
+from transport import get_transport  # Import shared HTTP transport
 
-    streamer_name = user_info['login']
-    profile_image_path = os.path.join(pfp_folder, f"profile_image_{streamer_name}.png")
-    
-    file_exists = os.path.exists(profile_image_path)
+class ProfileImagePipeline:
+    REVALIDATE_AFTER = 30 * 24 * 60 * 60  # Seconds before a downloaded profile image is checked for changes again
 
-    # Check if the file exists and if it is older than 30 days
-    if file_exists:
-        file_mod_time = datetime.fromtimestamp(os.path.getmtime(profile_image_path))
-        current_time = datetime.now()
-        file_age = current_time - file_mod_time
+    def __init__(self, pfp_folder="pfp", max_workers=4):
+        self.pfp_folder = pfp_folder
+        self.index_path = os.path.join(pfp_folder, "index.json")
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pfp")
+        self.lock = threading.Lock()
+        self.index_file_lock = threading.Lock()  # Keeps workers from writing the index file at the same time
+        self.pending = {}  # Streamer login to the future of its running download
 
-        if file_age > timedelta(days=30):
-            # File is older than 30 days, delete it
-            os.remove(profile_image_path)
-            logging.info(f"Deleted old profile image for {streamer_name}")
+        if not os.path.exists(pfp_folder):
+            os.makedirs(pfp_folder)
 
-            file_exists = False  # Indicate that the file needs to be downloaded
+        # Streamer login to url, ETag, Last-Modified and last check time of its downloaded profile image
+        self.index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as file:
+                    self.index = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read {self.index_path}, profile images will be revalidated: {str(e)}")
 
-    if not file_exists:
-        profile_image_url = user_info['profile_image_url']
-        response = requests.get(profile_image_url)
+    def get_image_path(self, streamer_login):
+        return os.path.join(self.pfp_folder, f"profile_image_{streamer_login}.png")
 
-        if response.status_code == 200:
-            with open(profile_image_path, 'wb') as img_file:
-                img_file.write(response.content)
-                logging.info(f"Downloaded profile image for {streamer_name}")
-        else:
-            logging.error(f"Failed to download profile image for {streamer_name}. Status code: {response.status_code}")
+    def request(self, user_info):
+        streamer_login = user_info['login']
 
+        with self.lock:
+            # Skip images that are fresh or already being downloaded, without touching the filesystem or network
+            entry = self.index.get(streamer_login)
+            if entry and entry['url'] == user_info['profile_image_url'] and time.time() - entry['checked_at'] < self.REVALIDATE_AFTER:
+                return
+            if streamer_login in self.pending:
+                return
+
+            self.pending[streamer_login] = self.executor.submit(self.download, streamer_login, user_info['profile_image_url'])
+
+    def wait(self, streamer_login, timeout=5):
+        with self.lock:
+            future = self.pending.get(streamer_login)
+
+        # Wait for a running download, so a notification has its profile image available
+        if future:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def download(self, streamer_login, profile_image_url):
+        try:
+            profile_image_path = self.get_image_path(streamer_login)
+            entry = self.index.get(streamer_login)
+
+            # Revalidate the existing image instead of downloading it again
+            headers = {}
+            if entry and entry['url'] == profile_image_url and os.path.exists(profile_image_path):
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+
+            try:
+                response = get_transport().get(profile_image_url, headers=headers, endpoint="pfp")
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Failed to download profile image for {streamer_login}: {type(e).__name__}")
+                return
+
+            if response.status_code == 304:
+                logging.debug(f"Profile image for {streamer_login} is still up to date")
+            elif response.status_code == 200:
+                # Write to a temporary file first, so a notification never shows a half written image
+                temp_path = f"{profile_image_path}.tmp"
+                with open(temp_path, 'wb') as img_file:
+                    img_file.write(response.content)
+                os.replace(temp_path, profile_image_path)
+                logging.info(f"Downloaded profile image for {streamer_login}")
+            else:
+                logging.error(f"Failed to download profile image for {streamer_login}. Status code: {response.status_code}")
+                return
+
+            with self.lock:
+                self.index[streamer_login] = {
+                    'url': profile_image_url,
+                    'etag': response.headers.get('ETag') or (entry or {}).get('etag'),
+                    'last_modified': response.headers.get('Last-Modified') or (entry or {}).get('last_modified'),
+                    'checked_at': time.time()
+                }
+                index = dict(self.index)
+
+            with self.index_file_lock:
+                temp_index_path = f"{self.index_path}.tmp"
+                with open(temp_index_path, 'w') as file:
+                    json.dump(index, file)
+                os.replace(temp_index_path, self.index_path)
+        except OSError as e:
+            logging.error(f"Could not save profile image for {streamer_login}: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending.pop(streamer_login, None)
+
+shared_pipeline = None
+pipeline_lock = threading.Lock()
+
+def get_pipeline():
+    global shared_pipeline
+
+    with pipeline_lock:
+        if shared_pipeline is None:
+            shared_pipeline = ProfileImagePipeline()
+    return shared_pipeline
+
+def download_profile_image(user_info):
+    # Queue the download on the background workers, this never blocks
+    get_pipeline().request(user_info)
+
+def wait_for_profile_image(streamer_login, timeout=5):
+    get_pipeline().wait(streamer_login, timeout)
@@ -0,0 +1,305 @@
+import os
+import hmac
+import json
+import time
+import queue
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from dotenv import load_dotenv
+
+from logging_handler import setup_logging # Import logging function
+from twitchauth import TwitchAuth, get_minimum_check_interval # Import TwitchAuth class and interval helper
+from usercache import UserCache # Import user info cache
+
+DEFAULT_PORT = 8765
+
+def parse_address(address):
+    # "host:port", "host" or ":port"
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or "127.0.0.1", int(port) if port else DEFAULT_PORT
+
+class PollerServer:
+    OFFLINE_RECHECK_INTERVAL = 15  # Default seconds between the extra checks of a streamer that just went missing
+
+    def __init__(self, auth, user_cache, check_interval, host="127.0.0.1", port=DEFAULT_PORT, secret=None, offline_recheck_interval=None, offline_confirm_checks=2):
+        self.auth = auth
+        self.user_cache = user_cache
+        self.check_interval = check_interval
+        self.secret = secret
+
+        # Farmers need offline_confirm_checks misses in a row, the first one comes from the full check.
+        # One more extra check than needed covers a failed batch in between
+        self.offline_recheck_interval = offline_recheck_interval or self.OFFLINE_RECHECK_INTERVAL
+        self.offline_rechecks = max(offline_confirm_checks, 1)
+
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.subscribers = {}  # Connection handler to the streamer logins it subscribed to
+        self.pending_logins = set()  # Newly subscribed logins that haven't been checked yet
+        self.last_status = {}  # Streamer login to its stream when it was last checked, None if it was offline
+        self.rechecks = {}  # Streamer login that just went missing to the time of its next extra check and the extra checks left
+
+        server = self
+
+        class PollerHandler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.send_lock = threading.Lock()
+
+            def send(self, message):
+                with self.send_lock:
+                    self.wfile.write((json.dumps(message) + "\n").encode())
+
+            def handle(self):
+                address = f"{self.client_address[0]}:{self.client_address[1]}"
+                logging.info(f"Farmer connected from {address}")
+                try:
+                    # Every line is a JSON message, the only message farmers send is the list of logins they want
+                    for line in self.rfile:
+                        message = json.loads(line)
+                        if server.secret and not hmac.compare_digest(str(message.get("secret", "")), server.secret):
+                            self.send({"type": "error", "message": "Invalid secret"})
+                            logging.warning(f"Farmer at {address} sent an invalid secret")
+                            return
+                        if message.get("type") == "subscribe":
+                            server.subscribe(self, message.get("logins", []))
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Connection to the farmer at {address} failed: {str(e)}")
+                finally:
+                    server.unsubscribe(self)
+                    logging.info(f"Farmer at {address} disconnected")
+
+        self.server = socketserver.ThreadingTCPServer((host, port), PollerHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+
+    def subscribe(self, handler, streamer_logins):
+        streamer_logins = {streamer_login.lower() for streamer_login in streamer_logins}
+        with self.lock:
+            self.subscribers[handler] = streamer_logins
+            known_logins = [streamer_login for streamer_login in streamer_logins if streamer_login in self.last_status]
+            self.pending_logins.update(streamer_logins.difference(self.last_status))
+            snapshot = {streamer_login: self.last_status[streamer_login] for streamer_login in known_logins}
+
+        logging.info(f"Farmer subscribed to {len(streamer_logins)} streamers")
+
+        # Send the last known status right away, streamers that were never checked are checked as soon as possible
+        if snapshot:
+            self.send(handler, self.get_status_message(list(snapshot), {streamer_login: stream for streamer_login, stream in snapshot.items() if stream}))
+        if self.pending_logins:
+            self.wake_event.set()
+
+    def unsubscribe(self, handler):
+        with self.lock:
+            self.subscribers.pop(handler, None)
+
+    def get_logins(self):
+        with self.lock:
+            return sorted(set().union(*self.subscribers.values()))
+
+    def get_status_message(self, checked_logins, live_streams):
+        users = {streamer_login: self.user_cache.get(streamer_login) for streamer_login in live_streams}
+        return {"type": "status", "checked": checked_logins, "live": live_streams, "users": users}
+
+    def send(self, handler, message):
+        try:
+            handler.send(message)
+        except OSError as e:
+            logging.warning(f"Could not send to a farmer, dropping it: {str(e)}")
+            self.unsubscribe(handler)
+
+    def publish(self, checked_logins, live_streams):
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+
+        # Every farmer only gets the streamers it subscribed to
+        for handler, streamer_logins in subscribers:
+            subscriber_checked = [streamer_login for streamer_login in checked_logins if streamer_login in streamer_logins]
+            if subscriber_checked:
+                subscriber_live = {streamer_login: live_streams[streamer_login] for streamer_login in subscriber_checked if streamer_login in live_streams}
+                self.send(handler, self.get_status_message(subscriber_checked, subscriber_live))
+
+    def poll(self, streamer_logins):
+        # Look up user info for new streamers and streamers whose cached info expired
+        self.user_cache.refresh(streamer_logins)
+
+        checked_logins = []
+        live_streams = {}
+        for start in range(0, len(streamer_logins), self.auth.BATCH_SIZE):
+            batch = streamer_logins[start:start + self.auth.BATCH_SIZE]
+            batch_live_streams = self.auth.get_live_streams_batch(user_logins=batch)
+
+            # Streamers in a failed batch are left out, farmers keep their last status until the next check
+            if batch_live_streams is None:
+                logging.warning(f"Could not check live streams for {len(batch)} streamers, retrying in {self.check_interval} seconds!")
+                continue
+            checked_logins += batch
+            live_streams.update(batch_live_streams)
+
+        with self.lock:
+            now = time.time()
+            for streamer_login in checked_logins:
+                # Streamers that just went missing are checked again soon, so farmers can confirm they are offline and close their tabs
+                if streamer_login in live_streams:
+                    self.rechecks.pop(streamer_login, None)
+                elif self.last_status.get(streamer_login):
+                    self.rechecks[streamer_login] = (now + self.offline_recheck_interval, self.offline_rechecks)
+                elif streamer_login in self.rechecks:
+                    checks_left = self.rechecks[streamer_login][1] - 1
+                    if checks_left > 0:
+                        self.rechecks[streamer_login] = (now + self.offline_recheck_interval, checks_left)
+                    else:
+                        del self.rechecks[streamer_login]
+
+                self.last_status[streamer_login] = live_streams.get(streamer_login)
+
+        self.publish(checked_logins, live_streams)
+
+    def run(self):
+        threading.Thread(target=self.server.serve_forever, name="poller-server", daemon=True).start()
+        logging.info(f"Poller listening on {self.server.server_address[0]}:{self.server.server_address[1]}")
+
+        next_poll_time = time.time()
+        while True:
+            if time.time() >= next_poll_time:
+                # Check every subscribed streamer once per interval, no matter how many farmers want it
+                streamer_logins = self.get_logins()
+                with self.lock:
+                    self.pending_logins.clear()
+                if streamer_logins:
+                    self.poll(streamer_logins)
+                next_poll_time = time.time() + max(self.check_interval, get_minimum_check_interval(len(streamer_logins)))
+            else:
+                # Check newly subscribed streamers and streamers that just went missing, instead of waiting for the next full check
+                with self.lock:
+                    now = time.time()
+                    recheck_logins = [streamer_login for streamer_login, (recheck_time, _) in self.rechecks.items() if recheck_time <= now]
+                    pending_logins = sorted(self.pending_logins.union(recheck_logins))
+                    self.pending_logins.clear()
+                if pending_logins:
+                    self.poll(pending_logins)
+
+            with self.lock:
+                next_check_time = min([next_poll_time] + [recheck_time for recheck_time, _ in self.rechecks.values()])
+            self.wake_event.wait(max(next_check_time - time.time(), 0))
+            self.wake_event.clear()
+
+class PollerClient:
+    RECONNECT_DELAY = 5
+
+    def __init__(self, address, secret=None):
+        self.host, self.port = parse_address(address)
+        self.secret = secret
+
+        self.lock = threading.Lock()
+        self.sock = None
+        self.streamer_logins = []
+        self.users = {}  # Streamer login to the user info sent by the poller
+        self.updates = queue.Queue()  # (checked logins, live streams) for every status the poller sends
+
+    def start(self):
+        threading.Thread(target=self.run, name="poller-client", daemon=True).start()
+
+    def set_streamers(self, streamer_logins):
+        with self.lock:
+            self.streamer_logins = list(streamer_logins)
+            sock = self.sock
+        if sock:
+            self.subscribe(sock)
+
+    def subscribe(self, sock):
+        with self.lock:
+            message = {"type": "subscribe", "logins": self.streamer_logins}
+        if self.secret:
+            message["secret"] = self.secret
+
+        try:
+            sock.sendall((json.dumps(message) + "\n").encode())
+        except OSError as e:
+            logging.warning(f"Could not subscribe at the poller: {str(e)}")
+
+    def get(self, streamer_login):
+        # Same lookup as UserCache, so the farmer can use the poller's user info
+        return self.users.get(streamer_login.lower())
+
+    def refresh(self, streamer_logins, force=False):
+        # User info is looked up by the poller
+        return 0
+
+    def get_update(self, timeout):
+        try:
+            return self.updates.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def run(self):
+        while True:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=10)
+                sock.settimeout(None)
+            except OSError as e:
+                logging.warning(f"Could not connect to the poller at {self.host}:{self.port}, retrying in {self.RECONNECT_DELAY} seconds: {str(e)}")
+                time.sleep(self.RECONNECT_DELAY)
+                continue
+
+            logging.info(f"Connected to the poller at {self.host}:{self.port}")
+            with self.lock:
+                self.sock = sock
+            self.subscribe(sock)
+
+            try:
+                for line in sock.makefile('r', encoding="utf-8"):
+                    message = json.loads(line)
+                    if message.get("type") == "status":
+                        self.users.update({streamer_login: user_info for streamer_login, user_info in message["users"].items() if user_info})
+                        self.updates.put((message["checked"], message["live"]))
+                    elif message.get("type") == "error":
+                        logging.error(f"Poller refused the connection: {message.get('message')}")
+            except (OSError, ValueError) as e:
+                logging.warning(f"Connection to the poller failed: {str(e)}")
+            finally:
+                with self.lock:
+                    self.sock = None
+                sock.close()
+
+            logging.warning(f"Lost the connection to the poller, reconnecting in {self.RECONNECT_DELAY} seconds!")
+            time.sleep(self.RECONNECT_DELAY)
+
+def parseargs():
+    parser = argparse.ArgumentParser(description="Polls Helix once for every connected farmer and publishes live status to them.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on, use 0.0.0.0 to accept farmers on other machines")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--interval", type=int, help="Check interval in seconds, defaults to check_interval in config.json")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of the log file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    # Load environment variables from .env file, the poller needs client_id and client_secret and optionally poller_secret
+    load_dotenv()
+    args = parseargs()
+    setup_logging(args.log_format, "poller.log")
+
+    # The check interval and how quickly a missing streamer is confirmed offline come from the same config as the farmers
+    config = {}
+    if os.path.exists("config.json"):
+        with open("config.json", 'r') as file:
+            config = json.load(file)
+    check_interval = args.interval if args.interval is not None else config.get('check_interval')
+    check_interval = max(check_interval or 15, 15)
+
+    auth = TwitchAuth(os.getenv("client_id"), os.getenv("client_secret"), api_base_url=os.getenv("helix_api_base_url"), oauth_url=os.getenv("helix_oauth_url"))
+    if not auth.authenticate():
+        logging.error("Could not get an access token, will retry on the next check. Check client_id and client_secret in .env if this keeps happening!")
+
+    if args.host not in ("127.0.0.1", "localhost") and not os.getenv("poller_secret"):
+        logging.warning("The poller accepts farmers from other machines without a poller_secret in .env!")
+
+    PollerServer(
+        auth, UserCache(auth), check_interval, args.host, args.port, os.getenv("poller_secret"),
+        config.get('offline_pending_check_interval'), config.get('offline_confirm_checks', 2)
+    ).run()
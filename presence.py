@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+import requests
+import threading
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+from transport import get_transport  # Import shared HTTP transport
+from scheduler import Scheduler  # Import event scheduler
+
+def parse_master_playlist(text, base_url):
+    # Returns (bandwidth, url) for every rendition in an HLS master playlist
+    renditions = []
+    bandwidth = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            bandwidth = 0
+            for attribute in line.split(":", 1)[1].split(","):
+                if attribute.startswith("BANDWIDTH="):
+                    bandwidth = int(attribute.split("=", 1)[1])
+        elif line and not line.startswith("#") and bandwidth is not None:
+            renditions.append((bandwidth, urljoin(base_url, line)))
+            bandwidth = None
+
+    return renditions
+
+def parse_media_playlist(text, base_url):
+    # Returns the target duration and the segment urls of an HLS media playlist
+    if not text.startswith("#EXTM3U"):
+        raise ValueError("Not an HLS playlist")
+
+    target_duration = 2
+    segments = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            target_duration = float(line.split(":", 1)[1])
+        elif line and not line.startswith("#"):
+            segments.append(urljoin(base_url, line))
+
+    return target_duration, segments
+
+class PresenceFarmer:
+    GQL_URL = "https://gql.twitch.tv/gql"
+    USHER_URL = "https://usher.ttvnw.net/api/channel/hls/{login}.m3u8"
+    GQL_CLIENT_ID = "kimne78kx3ncx6brgmgvjw0ex5rc1a"  # Public client id of the Twitch web player
+    PLAYBACK_ACCESS_TOKEN_QUERY = 'query PlaybackAccessToken($login: String!) { streamPlaybackAccessToken(channelName: $login, params: {platform: "web", playerBackend: "mediaplayer", playerType: "site"}) { value signature } }'
+    MAX_RETRY_DELAY = 60
+
+    def __init__(self, fetch_segments=False, max_workers=4, transport=None):
+        self.fetch_segments = fetch_segments
+        self.transport = transport or get_transport()
+        self.auth_token = os.getenv("twitch_auth_token")  # Optional, ties the playback session to the Twitch account
+
+        self.streams = {}  # Streamer login to its playlist url, last fetched segment and failure count
+        self.lock = threading.Lock()
+        self.scheduler = Scheduler()  # Next playlist refresh of every stream
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="presence")
+        self.thread = None
+
+    def start(self, streamer_login):
+        with self.lock:
+            if streamer_login in self.streams:
+                return
+            self.streams[streamer_login] = {"playlist_url": None, "last_segment": None, "failures": 0}
+
+            # One thread schedules the refreshes of every stream, the work itself runs on a small pool
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, name="presence", daemon=True)
+                self.thread.start()
+
+        self.scheduler.schedule(streamer_login, time.time())
+        logging.info(f"Started browserless farming for {streamer_login}")
+
+    def stop(self, streamer_login):
+        with self.lock:
+            stream = self.streams.pop(streamer_login, None)
+        self.scheduler.unschedule(streamer_login)
+        if stream:
+            logging.info(f"Stopped browserless farming for {streamer_login}")
+
+    def is_farming(self, streamer_login):
+        return streamer_login in self.streams
+
+    def run(self):
+        while True:
+            self.scheduler.wait()
+            for streamer_login in self.scheduler.pop_due():
+                self.executor.submit(self.refresh, streamer_login)
+
+    def get_playlist_url(self, streamer_login):
+        headers = {"Client-ID": self.GQL_CLIENT_ID}
+        if self.auth_token:
+            headers["Authorization"] = f"OAuth {self.auth_token}"
+
+        # Get a playback access token, like the web player does
+        response = self.transport.post(self.GQL_URL, json={"query": self.PLAYBACK_ACCESS_TOKEN_QUERY, "variables": {"login": streamer_login}}, headers=headers, endpoint="gql")
+        response.raise_for_status()
+        access_token = response.json()["data"]["streamPlaybackAccessToken"]
+        if not access_token:
+            raise ValueError("No playback access token")
+
+        # Get the master playlist and pick the lowest rendition
+        master_url = self.USHER_URL.format(login=streamer_login)
+        response = self.transport.get(master_url, params={"sig": access_token["signature"], "token": access_token["value"], "allow_source": "true", "allow_audio_only": "true"}, endpoint="hls/master")
+        response.raise_for_status()
+
+        renditions = parse_master_playlist(response.text, response.url)
+        if not renditions:
+            raise ValueError("No renditions in master playlist")
+        return min(renditions)[1]
+
+    def refresh(self, streamer_login):
+        stream = self.streams.get(streamer_login)
+        if not stream:
+            return
+
+        try:
+            if not stream["playlist_url"]:
+                stream["playlist_url"] = self.get_playlist_url(streamer_login)
+
+            response = self.transport.get(stream["playlist_url"], endpoint="hls/playlist")
+            response.raise_for_status()
+            target_duration, segments = parse_media_playlist(response.text, response.url)
+
+            # Optionally fetch the newest segment and throw the data away
+            if self.fetch_segments and segments and segments[-1] != stream["last_segment"]:
+                with self.transport.get(segments[-1], stream=True, endpoint="hls/segment") as segment_response:
+                    for _ in segment_response.iter_content(chunk_size=64 * 1024):
+                        pass
+                stream["last_segment"] = segments[-1]
+
+            stream["failures"] = 0
+            delay = max(target_duration, 1)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            # Get a new playlist url, the access token may have expired
+            stream["playlist_url"] = None
+            stream["failures"] += 1
+            delay = min(2 ** stream["failures"], self.MAX_RETRY_DELAY)
+            # Request errors hold the playlist url and its access token, so only the error type is logged
+            logging.warning(f"Browserless farming for {streamer_login} failed, retrying in {delay} seconds: {type(e).__name__}")
+
+        # Refresh the playlist again once a new segment is expected
+        if streamer_login in self.streams:
+            self.scheduler.schedule(streamer_login, time.time() + delay)
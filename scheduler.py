@@ -0,0 +1,138 @@
+import time
+import heapq
+import itertools
+import threading
+
+from state import LIVE_NOTIFIED, FARMING, OFFLINE_PENDING, CLOSED # Import streamer states
+
+class Scheduler:
+    def __init__(self):
+        self.heap = []  # (due time, sequence number, key), entries that no longer match due_times are skipped
+        self.due_times = {}  # Key to its current due time
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+
+    def schedule(self, key, due_time):
+        with self.lock:
+            self.due_times[key] = due_time
+            heapq.heappush(self.heap, (due_time, next(self.sequence), key))
+            earliest = self.heap[0][0] == due_time
+
+        # Wake up a sleeping loop if this is now the first event
+        if earliest:
+            self.wake()
+
+    def unschedule(self, key):
+        with self.lock:
+            self.due_times.pop(key, None)
+
+    def next_due_time(self):
+        with self.lock:
+            self.drop_stale()
+            return self.heap[0][0] if self.heap else None
+
+    def drop_stale(self):
+        # Remove entries that were rescheduled or unscheduled since they were pushed
+        while self.heap and self.due_times.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def pop_due(self, now=None, window=0):
+        now = time.time() if now is None else now
+        due_keys = []
+
+        with self.lock:
+            # Nothing to do until the first event is due
+            self.drop_stale()
+            if not self.heap or self.heap[0][0] > now:
+                return due_keys
+
+            # Also take events that are due within the window, so they can share a request
+            while True:
+                self.drop_stale()
+                if not self.heap or self.heap[0][0] > now + window:
+                    break
+                due_time, _, key = heapq.heappop(self.heap)
+                del self.due_times[key]
+                due_keys.append(key)
+
+            # Compact the heap if most of it is stale
+            if len(self.heap) > 2 * len(self.due_times) + 64:
+                self.heap = [(due_time, sequence, key) for due_time, sequence, key in self.heap if self.due_times.get(key) == due_time]
+                heapq.heapify(self.heap)
+
+        return due_keys
+
+    def wait(self, timeout=None):
+        # Sleep until the next event is due, an external wake up, or the timeout, whichever comes first
+        next_due_time = self.next_due_time()
+        if next_due_time is not None:
+            due_in = max(next_due_time - time.time(), 0)
+            timeout = due_in if timeout is None else min(timeout, due_in)
+
+        self.wake_event.wait(timeout)
+        self.wake_event.clear()
+
+    def wake(self):
+        self.wake_event.set()
+
+class PollScheduler(Scheduler):
+    BATCH_WINDOW = 5  # Seconds ahead of time a streamer may be checked, to share a request with other streamers
+    OFFLINE_PENDING_CHECK_INTERVAL = 15  # Seconds between the checks that confirm a streamer went offline
+
+    def __init__(self, config, store, schedules=None):
+        super().__init__()
+        self.config = config
+        self.store = store
+        self.schedules = schedules
+        self.start_time = time.time()
+
+    def get_interval(self, streamer_login):
+        check_interval = self.config.get('check_interval')
+        streamer = self.store.find(streamer_login)
+
+        # Live streamers and streamers that just went offline are checked at their own rates
+        if streamer and streamer.state in (LIVE_NOTIFIED, FARMING):
+            return self.config.get('live_check_interval', check_interval)
+        if streamer and streamer.state == OFFLINE_PENDING:
+            return self.config.get('offline_pending_check_interval', self.OFFLINE_PENDING_CHECK_INTERVAL)
+
+        # Streamers that haven't been live for a while can be checked less often, set long_offline_check_interval to enable it
+        offline_since = streamer.offline_since if streamer and streamer.state == CLOSED else self.start_time
+        if time.time() - offline_since > self.config.get('long_offline_after', 60 * 60):
+            interval = self.config.get('long_offline_check_interval', check_interval)
+        else:
+            interval = self.config.get('offline_check_interval', check_interval)
+
+        # Use the learned schedule to check more often around usual go-live times, and less often when the streamer is never live
+        if self.schedules:
+            now = time.time()
+            prediction = self.schedules.predict(streamer_login, now, interval)
+            if prediction == "likely":
+                return self.config.get('predicted_check_interval', max(check_interval // 2, 15))
+            if prediction == "quiet":
+                interval = self.config.get('quiet_check_interval', check_interval * 4)
+
+                # Never back off past the next time the streamer is likely to go live
+                seconds_until_likely = self.schedules.get_seconds_until_likely(streamer_login, now)
+                if seconds_until_likely is not None:
+                    interval = min(interval, max(seconds_until_likely, check_interval))
+
+        return interval
+
+    def add_streamers(self, streamer_logins):
+        now = time.time()
+        for streamer_login in streamer_logins:
+            self.schedule(streamer_login, now)
+
+    def remove_streamers(self, streamer_logins):
+        for streamer_login in streamer_logins:
+            self.unschedule(streamer_login)
+
+    def reschedule_streamers(self, streamer_logins, interval=None):
+        now = time.time()
+        for streamer_login in streamer_logins:
+            self.schedule(streamer_login, now + (interval or self.get_interval(streamer_login)))
+
+    def pop_due_streamers(self):
+        return self.pop_due(window=self.BATCH_WINDOW)
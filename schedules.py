@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from state import LIVE_NOTIFIED, FARMING, CLOSED, LIVE_STATES # Import streamer states
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+WEEK = 7 * 24 * 60 * 60
+DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+def get_slot(timestamp):
+    # Schedules follow local time, since that's what streamers plan their streams around
+    local_time = time.localtime(timestamp)
+    return local_time.tm_wday * SLOTS_PER_DAY + (local_time.tm_hour * 60 + local_time.tm_min) // SLOT_MINUTES
+
+def format_slot(slot):
+    minutes = (slot % SLOTS_PER_DAY) * SLOT_MINUTES
+    return f"{DAY_NAMES[slot // SLOTS_PER_DAY]} {minutes // 60:02d}:{minutes % 60:02d}"
+
+class StreamerSchedules:
+    MIN_SESSIONS = 3  # Sessions needed before the history is used to predict anything
+    LIKELY_PROBABILITY = 0.25  # Share of observed weeks a slot needs a go-live in to be considered likely
+    MAX_OPEN_SESSION = 24 * 60 * 60  # A go-live this long after an unfinished session starts a new session
+
+    def __init__(self, filename="schedules.json"):
+        self.filename = filename
+        self.lock = threading.Lock()
+
+        # Streamer login to first_seen, open_since, session count and weekly go-live and live histograms
+        self.streamers = {}
+        if os.path.exists(filename):
+            try:
+                with open(filename, 'r') as file:
+                    self.streamers = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read {filename}, starting with empty schedules: {str(e)}")
+
+    def get(self, streamer_login):
+        history = self.streamers.get(streamer_login)
+        if history is None:
+            history = self.streamers[streamer_login] = {
+                "first_seen": time.time(),
+                "open_since": None,
+                "sessions": 0,
+                "starts": [0] * SLOTS_PER_WEEK,
+                "live": [0] * SLOTS_PER_WEEK
+            }
+        return history
+
+    def on_transition(self, streamer, old_state, new_state):
+        # Record go-lives and confirmed go-offlines from the state store, go-lives at the time the stream started
+        if new_state in (LIVE_NOTIFIED, FARMING) and old_state not in LIVE_STATES:
+            self.record_online(streamer.login, streamer.started_at or time.time())
+        elif new_state == CLOSED:
+            self.record_offline(streamer.login, time.time())
+
+    def record_online(self, streamer_login, timestamp):
+        with self.lock:
+            history = self.get(streamer_login)
+
+            # A restart while the streamer was live continues the same session
+            if history["open_since"] and timestamp - history["open_since"] < self.MAX_OPEN_SESSION:
+                return
+
+            history["open_since"] = timestamp
+            history["starts"][get_slot(timestamp)] += 1
+
+        # Saved right away, so a restart while the streamer is live knows the session is still open
+        self.save()
+
+    def record_offline(self, streamer_login, timestamp):
+        with self.lock:
+            history = self.get(streamer_login)
+            if not history["open_since"]:
+                return
+
+            # Count every slot the session covered once
+            start = history["open_since"]
+            slots = {get_slot(slot_time) for slot_time in range(int(start), int(timestamp) + 1, SLOT_MINUTES * 60)}
+            slots.add(get_slot(timestamp))
+            for slot in slots:
+                history["live"][slot] += 1
+
+            history["open_since"] = None
+            history["sessions"] += 1
+
+        self.save()
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.streamers)
+
+        # Write to a temporary file first, so a crash never leaves half written statistics behind
+        try:
+            temp_filename = f"{self.filename}.tmp"
+            with open(temp_filename, 'w') as file:
+                file.write(data)
+            os.replace(temp_filename, self.filename)
+        except OSError as e:
+            logging.error(f"Could not write {self.filename}: {str(e)}")
+
+    def get_weeks_observed(self, history, now):
+        return max((now - history["first_seen"]) / WEEK, 1)
+
+    def predict(self, streamer_login, now, horizon):
+        # Returns "likely" if the streamer often goes live within the horizon, "quiet" if they are never live around now, otherwise None
+        history = self.streamers.get(streamer_login)
+        if not history or history["sessions"] < self.MIN_SESSIONS:
+            return None
+
+        weeks_observed = self.get_weeks_observed(history, now)
+        current_slot = get_slot(now)
+        upcoming_slots = {get_slot(slot_time) for slot_time in range(int(now), int(now + horizon) + 1, SLOT_MINUTES * 60)}
+        upcoming_slots.add(current_slot)
+
+        if any(history["starts"][slot] / weeks_observed >= self.LIKELY_PROBABILITY for slot in upcoming_slots):
+            return "likely"
+        if not any(history["starts"][slot] or history["live"][slot] for slot in upcoming_slots):
+            return "quiet"
+        return None
+
+    def get_seconds_until_likely(self, streamer_login, now):
+        history = self.streamers.get(streamer_login)
+        if not history or history["sessions"] < self.MIN_SESSIONS:
+            return None
+
+        # Find the start of the next slot in which the streamer is likely to go live
+        weeks_observed = self.get_weeks_observed(history, now)
+        slot_start = now - now % (SLOT_MINUTES * 60)
+        for slot_index in range(1, SLOTS_PER_WEEK + 1):
+            slot_time = slot_start + slot_index * SLOT_MINUTES * 60
+            if history["starts"][get_slot(slot_time)] / weeks_observed >= self.LIKELY_PROBABILITY:
+                return slot_time - now
+        return None
+
+    def print_schedules(self, streamer_login=None):
+        if not self.streamers:
+            print("No schedules have been recorded yet.")
+            return
+
+        if streamer_login:
+            history = self.streamers.get(streamer_login.lower())
+            if not history:
+                print(f"No schedule has been recorded for {streamer_login}.")
+                return
+
+            # Print a weekly grid with the share of observed weeks the streamer was live in every hour
+            weeks_observed = self.get_weeks_observed(history, time.time())
+            print(f"{streamer_login}: {history['sessions']} sessions over {weeks_observed:.1f} weeks (% of weeks live per hour)")
+            print("     " + "".join(f"{hour:>4}" for hour in range(24)))
+            for day in range(7):
+                row = []
+                for hour in range(24):
+                    slot = day * SLOTS_PER_DAY + hour * 60 // SLOT_MINUTES
+                    live = max(history["live"][slot:slot + 60 // SLOT_MINUTES])
+                    row.append(f"{min(round(live / weeks_observed * 100), 100):>4}" if live else "   .")
+                print(f"{DAY_NAMES[day]:<5}" + "".join(row))
+            return
+
+        # Print a summary with the most common go-live times of every streamer
+        for login, history in sorted(self.streamers.items()):
+            weeks_observed = self.get_weeks_observed(history, time.time())
+            top_slots = sorted(range(SLOTS_PER_WEEK), key=lambda slot: history["starts"][slot], reverse=True)[:3]
+            top_starts = ", ".join(f"{format_slot(slot)} ({history['starts'][slot]}x)" for slot in top_slots if history["starts"][slot])
+            print(f"{login}: {history['sessions']} sessions over {weeks_observed:.1f} weeks. Usually goes live: {top_starts or 'unknown'}")
@@ -9,6 +9,7 @@ from msvcrt import getch
 from dotenv import load_dotenv
 
 from streamers import read_streamers_from_file # Import list reading functions
+from twitchauth import get_minimum_check_interval # Import interval helper
 
 def yes_or_no(value, default):
     if default:
@@ -26,13 +27,15 @@ def yes_or_no(value, default):
         value = default
     return value
 
-def first_time_setup(skip_intro):
+def first_time_setup(skip_intro, check_credentials=True):
     # Load environment variables from .env file
     load_dotenv()
 
+    # Read the config only once, every change below is written back at most once at the end
+    config = None
+    save_config = False
     if os.path.exists("config.json"):
-        with open("config.json", 'r') as file:
-            config = json.load(file)
+        config = check_and_load_config()
         streamers_file = config.get('active_list')
     else:
         streamers_file = "streamers.txt"
@@ -73,8 +76,8 @@ def first_time_setup(skip_intro):
             print()
 
         check_env_vars(True)
-    # Step 1: Fail condition
-    if os.getenv("client_id") == "" or os.getenv("client_secret") == "":
+    # Step 1: Fail condition, farmers that get their live status from a poller don't need the credentials
+    if check_credentials and (os.getenv("client_id") == "" or os.getenv("client_secret") == ""):
         print("Seems like you forgot to enther the Twitch API credentials into the .env file. Once you've done that, you can proceed with the setup.")
         print("Press any key to continue...")
         getch()
@@ -98,9 +101,8 @@ def first_time_setup(skip_intro):
             time.sleep(2)
             print()
         
-        if os.path.exists("config.json"):
-            if config.get("active_list"):
-                default_streamer_list = config.get("active_list")
+        if config and config.get("active_list"):
+            default_streamer_list = config.get("active_list")
         else:
             default_streamer_list = "streamers.txt"
         
@@ -127,7 +129,7 @@ def first_time_setup(skip_intro):
         check_streamers_list(streamers_file.get('streamers_file'), True)
 
     # Step 3: Config
-    if not os.path.exists("config.json"):
+    if config is None:
         if not os.path.exists("fts.json"):
             # Write the configuration dictionary to a JSON file
             with open("fts.json", 'w') as file:
@@ -151,7 +153,7 @@ def first_time_setup(skip_intro):
         else:
             streamers_file = "streamers.txt"
 
-        minimum_check_interval = len(read_streamers_from_file(streamers_file)) * 5
+        minimum_check_interval = get_minimum_check_interval(len(read_streamers_from_file(streamers_file)))
         if minimum_check_interval > 15:
             default_check_interval = minimum_check_interval
         else:
@@ -160,7 +162,7 @@ def first_time_setup(skip_intro):
         if not fts_data.get('skip_intro') and not skip_intro:
             print("First off, the check interval. This is the interval between each check in with Twitch to check if the streamers are live.")
             time.sleep(2)
-            print("The absolute minimum for this interval is 15 seconds, but there is also a dynamic minimum. For every streamer added in the list, 5 seconds are added to the dynamic limit.")
+            print("The absolute minimum for this interval is 15 seconds, but there is also a dynamic minimum. For every 100 streamers added in the list, 5 seconds are added to the dynamic limit, since Twitch is checked for up to 100 streamers at a time.")
             time.sleep(2)
             print(f"Based of the current list ({streamers_file}), the minimum is {default_check_interval}.")
             time.sleep(2)
@@ -228,7 +230,7 @@ def first_time_setup(skip_intro):
         print()
         autofarming = yes_or_no(autofarming, True)
     
-        config_data = {
+        config = {
             "check_interval": check_interval,
             "max_idle_duration": max_idle_duration,
             "notification": notification,
@@ -238,9 +240,7 @@ def first_time_setup(skip_intro):
             "idle_duration_same_as_check_interval": idle_duration_same_as_check_interval
         }
 
-        # Write the configuration dictionary to a JSON file
-        with open(("config.json"), 'w') as file:
-            json.dump(config_data, file, indent=4)
+        save_config = True
         
         print("That's it! The script is now ready!")
         logging.info("First time setup complete!")
@@ -249,36 +249,29 @@ def first_time_setup(skip_intro):
     if os.path.exists("fts.json"):
         os.remove("fts.json")
 
-    # Load up the most recent config
-    with open("config.json", 'r') as file:
-        config = json.load(file)
-
     # Update dynamic check interval
     if config.get('dynamic_check_interval'):
-        minimum_check_interval = len(read_streamers_from_file(streamers_file)) * 5
+        minimum_check_interval = get_minimum_check_interval(len(read_streamers_from_file(streamers_file)))
         if minimum_check_interval > 15:
             default_check_interval = minimum_check_interval
         else:
             default_check_interval = 15
 
-        check_interval = {"check_interval": default_check_interval}
-        config.update(check_interval)
-
-        # Write the configuration dictionary to a JSON file
-        with open("config.json", 'w') as file:
-            json.dump(config, file, indent=4)
+        if config.get("check_interval") != default_check_interval:
+            config["check_interval"] = default_check_interval
+            save_config = True
 
     # Update idle duration
-    if config.get("idle_duration_same_as_check_interval"):
-        max_idle_duration = config.get("check_interval")
-
-        max_idle_duration = {"max_idle_duration": max_idle_duration}
-        config.update(max_idle_duration)
+    if config.get("idle_duration_same_as_check_interval") and config.get("max_idle_duration") != config.get("check_interval"):
+        config["max_idle_duration"] = config.get("check_interval")
+        save_config = True
 
-        # Write the configuration dictionary to a JSON file
+    # Write the configuration dictionary to a JSON file, only if something changed
+    if save_config:
         with open("config.json", 'w') as file:
             json.dump(config, file, indent=4)
-    
+
+    return config
 
 
 def check_and_load_config():
@@ -319,6 +312,7 @@ def check_streamers_list(streamers_file, fts = False):
     if not os.path.exists(streamers_file):
         if not fts: logging.info(f"Open {streamers_file} to add your favorite streamers!")
         default_streamers = ["# Add streamer names on separate lines, like this:",
+                         "# (add farm=hls after a name to farm that streamer without opening a browser tab)",
                          "MattEU",
                          "lirik",
                          "shxtou"]
@@ -0,0 +1,114 @@
+import time
+
+# Streamer states
+OFFLINE = "offline"  # Not seen live since the script started
+LIVE_NOTIFIED = "live-notified"  # Live, without a managed browser tab (notified if notifications are enabled)
+FARMING = "farming"  # Live, with a managed browser tab open
+OFFLINE_PENDING = "offline-pending"  # Missing from the live streams once, waiting for confirmation
+CLOSED = "closed"  # Confirmed offline, browser tab closed
+
+LIVE_STATES = (LIVE_NOTIFIED, FARMING, OFFLINE_PENDING)
+
+# Allowed transitions between streamer states
+TRANSITIONS = {
+    OFFLINE: (LIVE_NOTIFIED, FARMING),
+    LIVE_NOTIFIED: (FARMING, OFFLINE_PENDING),
+    FARMING: (LIVE_NOTIFIED, OFFLINE_PENDING),
+    OFFLINE_PENDING: (LIVE_NOTIFIED, FARMING, CLOSED),
+    CLOSED: (LIVE_NOTIFIED, FARMING),
+}
+
+class StreamerState:
+    __slots__ = ("login", "state", "window_handle", "backend", "notification_sent", "live_since", "offline_since", "farming_since", "offline_checks", "started_at")
+
+    def __init__(self, login):
+        self.login = login
+        self.state = OFFLINE
+        self.window_handle = None
+        self.backend = None  # Farming backend while farming, "browser" or "hls"
+        self.notification_sent = False
+        self.live_since = None
+        self.offline_since = None
+        self.farming_since = None
+        self.offline_checks = 0  # Checks that found the streamer missing since it was last seen live
+        self.started_at = None  # Start of the current stream according to Twitch, set before the streamer goes live
+
+    def is_live(self):
+        return self.state in LIVE_STATES
+
+    def __repr__(self):
+        return f"StreamerState({self.login!r}, {self.state!r}, window_handle={self.window_handle!r})"
+
+class StateStore:
+    def __init__(self):
+        self.streamers = {}  # Streamer login to its state
+        self.window_handles = {}  # Window handle to the streamer login farmed in it
+        self.listeners = []  # Called with (streamer, old state, new state) after every state change
+
+    def get(self, streamer_login):
+        streamer = self.streamers.get(streamer_login)
+        if streamer is None:
+            streamer = self.streamers[streamer_login] = StreamerState(streamer_login)
+        return streamer
+
+    def find(self, streamer_login):
+        return self.streamers.get(streamer_login)
+
+    def find_by_window(self, window_handle):
+        streamer_login = self.window_handles.get(window_handle)
+        return self.streamers.get(streamer_login) if streamer_login else None
+
+    def transition(self, streamer_login, new_state, window_handle=None, backend=None):
+        streamer = self.get(streamer_login)
+
+        if new_state != streamer.state and new_state not in TRANSITIONS[streamer.state]:
+            raise ValueError(f"Invalid state transition for {streamer_login}: {streamer.state} -> {new_state}")
+
+        now = time.time()
+        if new_state in (LIVE_NOTIFIED, FARMING) and not streamer.is_live():
+            streamer.live_since = now
+            streamer.offline_since = None
+            streamer.notification_sent = False
+        elif new_state == OFFLINE_PENDING and streamer.state != OFFLINE_PENDING:
+            streamer.offline_since = now
+            streamer.offline_checks = 0
+        elif new_state == CLOSED:
+            streamer.live_since = None
+
+        # Keep the window handle index in sync, only farming streamers and streamers pending offline keep a tab
+        if new_state == FARMING:
+            self.set_window(streamer, window_handle or streamer.window_handle)
+            streamer.backend = backend or streamer.backend
+        elif new_state in (LIVE_NOTIFIED, CLOSED):
+            self.set_window(streamer, None)
+            streamer.backend = None
+
+        old_state = streamer.state
+        streamer.state = new_state
+
+        if new_state != old_state:
+            for listener in self.listeners:
+                listener(streamer, old_state, new_state)
+        return streamer
+
+    def set_window(self, streamer, window_handle):
+        if streamer.window_handle:
+            self.window_handles.pop(streamer.window_handle, None)
+        streamer.window_handle = window_handle
+        if window_handle:
+            self.window_handles[window_handle] = streamer.login
+
+    def remove(self, streamer_login):
+        streamer = self.streamers.pop(streamer_login, None)
+        if streamer and streamer.window_handle:
+            self.window_handles.pop(streamer.window_handle, None)
+        return streamer
+
+    def in_state(self, *states):
+        return [streamer for streamer in self.streamers.values() if streamer.state in states]
+
+    def count_states(self):
+        counts = dict.fromkeys(TRANSITIONS, 0)
+        for streamer in list(self.streamers.values()):
+            counts[streamer.state] += 1
+        return counts
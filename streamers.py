@@ -36,15 +36,93 @@
 #                                                                                
 
 import os
+import logging
+from urllib.parse import urlparse
+
+def normalize_login(line):
+    login = line.strip()
+
+    # Accept channel URLs like https://www.twitch.tv/login or twitch.tv/login
+    if "twitch.tv/" in login:
+        if "://" not in login:
+            login = f"https://{login}"
+        path = [part for part in urlparse(login).path.split("/") if part]
+        login = path[0] if path else ""
+
+    # Accept @login
+    return login.lstrip("@").lower()
+
+def parse_streamer_line(line):
+    # A line is a streamer login, optionally followed by options like "farm=hls"
+    parts = line.split()
+    options = {}
+    for part in parts[1:]:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            options[key.lower()] = value
+
+    return normalize_login(parts[0]), options
+
+def parse_streamers(lines):
+    # Use a dictionary to remove duplicates while keeping the order of the list
+    streamers = {}
+
+    for line in lines:
+        # Ignore comments and empty lines
+        if line.strip() and not line.strip().startswith("#"):
+            streamer_login, options = parse_streamer_line(line)
+            if streamer_login:
+                streamers[streamer_login] = options
+
+    return streamers
 
 def read_streamers_from_file(filename = "streamers.txt"):
-    streamers = []
+    return list(read_streamers_with_options(filename))
+
+def read_streamers_with_options(filename = "streamers.txt"):
+    streamers = {}
 
     if os.path.exists(filename):
         with open(filename, "r") as file:
-            for line in file:
-                # Ignore comments and empty lines
-                if line.strip() and not line.startswith("#"):
-                    streamers.append(line.strip())
+            streamers = parse_streamers(file)
+
+    return streamers
+
+class StreamerList:
+    def __init__(self, filename = "streamers.txt"):
+        self.filename = filename
+        self.streamers = []
+        self.streamer_set = set()
+        self.options = {}  # Streamer login to the options given after it in the list
+        self.signature = None  # Modification time and size of the file when it was last read
+
+    def get_option(self, streamer_login, key, default=None):
+        return self.options.get(streamer_login, {}).get(key, default)
+
+    def reload(self):
+        # Only read the file again if it changed, otherwise there is nothing to report
+        try:
+            stat = os.stat(self.filename)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+
+        if signature == self.signature:
+            return [], []
+
+        options = read_streamers_with_options(self.filename) if signature else {}
+        streamers = list(options)
+        streamer_set = set(streamers)
+
+        # Report which streamers were added to and removed from the list
+        added = [streamer_login for streamer_login in streamers if streamer_login not in self.streamer_set]
+        removed = [streamer_login for streamer_login in self.streamers if streamer_login not in streamer_set]
+
+        self.streamers = streamers
+        self.streamer_set = streamer_set
+        self.options = options
+        self.signature = signature
 
-    return streamers
\ No newline at end of file
+        if added or removed:
+            logging.info(f"Streamer list loaded: {len(streamers)} streamers, {len(added)} added, {len(removed)} removed")
+        return added, removed
@@ -0,0 +1,143 @@
+import logging
+
+# Runs before Twitch's own scripts in every farm tab. The lowest quality and mute are set on the player of the page, not in
+# localStorage, which the farm tabs share with the user's own Twitch tabs. Player settings the page saves anyway are put back.
+# Chat messages are hidden while the chat input with the channel points button stays, so bonus chests can be claimed
+MINIMAL_SCRIPT = """
+(function () {
+    if (window.__farmerMinimal) {
+        return;
+    }
+    window.__farmerMinimal = true;
+
+    var PLAYER_SETTINGS = ['video-quality', 'video-muted', 'volume'];
+    var savedSettings = {};
+    try {
+        PLAYER_SETTINGS.forEach(function (key) {
+            savedSettings[key] = localStorage.getItem(key);
+        });
+    } catch (e) {}
+
+    function restoreSettings() {
+        try {
+            PLAYER_SETTINGS.forEach(function (key) {
+                if (localStorage.getItem(key) === savedSettings[key]) {
+                    return;
+                }
+                if (savedSettings[key] === null) {
+                    localStorage.removeItem(key);
+                } else {
+                    localStorage.setItem(key, savedSettings[key]);
+                }
+            });
+        } catch (e) {}
+    }
+
+    function findPlayer() {
+        // The media player instance is a prop of a React component above the video element
+        var video = document.querySelector('video');
+        var fiberKey = video && Object.keys(video).find(function (key) {
+            return key.indexOf('__reactFiber') === 0 || key.indexOf('__reactInternalInstance') === 0;
+        });
+        for (var fiber = fiberKey && video[fiberKey]; fiber; fiber = fiber.return) {
+            var props = fiber.memoizedProps;
+            if (props && props.mediaPlayerInstance && props.mediaPlayerInstance.getQualities) {
+                return props.mediaPlayerInstance;
+            }
+        }
+        return null;
+    }
+
+    function setupPlayer() {
+        document.querySelectorAll('video').forEach(function (video) {
+            video.muted = true;
+        });
+
+        try {
+            var player = findPlayer();
+            if (player) {
+                player.setMuted(true);
+                var qualities = player.getQualities() || [];
+                var lowest = qualities.reduce(function (lowest, quality) {
+                    return !lowest || quality.bitrate < lowest.bitrate ? quality : lowest;
+                }, null);
+                var current = player.getQuality();
+                if (lowest && (!current || current.group !== lowest.group)) {
+                    player.setQuality(lowest);
+                }
+            }
+        } catch (e) {}
+        restoreSettings();
+    }
+
+    // Twitch picks the quality again when the stream or channel changes, so it is checked now and then
+    document.addEventListener('play', function (event) {
+        event.target.muted = true;
+        setTimeout(setupPlayer, 1000);
+    }, true);
+    setInterval(setupPlayer, 10000);
+    window.addEventListener('pagehide', restoreSettings);
+    setupPlayer();
+
+    if (!document.getElementById('farmer-minimal-style')) {
+        var style = document.createElement('style');
+        style.id = 'farmer-minimal-style';
+        style.textContent = '.chat-scrollable-area__message-container, .chat-room__content .simplebar-content { display: none !important; }';
+        (document.head || document.documentElement).appendChild(style);
+    }
+})();
+"""
+
+# Requests a farm tab doesn't need. Video, GQL and the spade events that credit watch time must never be blocked
+BLOCKED_URLS = [
+    # Ads and trackers
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*amazon-adsystem.com*",
+    "*imasdk.googleapis.com*",
+    "*scorecardresearch.com*",
+    # Emotes and badges
+    "*static-cdn.jtvnw.net/emoticons/*",
+    "*static-cdn.jtvnw.net/badges/*",
+    "*cdn.betterttv.net*",
+    "*cdn.frankerfacez.com*",
+    "*cdn.7tv.app*",
+    # Extensions
+    "*.ext-twitch.tv*",
+    "*extension-files.twitch.tv*",
+]
+
+def apply_minimal_profile(driver, cpu_throttling_rate=4, blocked_urls=()):
+    # Set up the current tab before it loads a channel, the settings stay for every page the tab loads.
+    # Returns the identifier of the page script, so it can be removed again, None if the profile couldn't be applied
+    try:
+        script_id = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": MINIMAL_SCRIPT})["identifier"]
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS + list(blocked_urls)})
+        if cpu_throttling_rate > 1:
+            driver.execute_cdp_cmd("Emulation.setCPUThrottlingRate", {"rate": cpu_throttling_rate})
+        return script_id
+    except Exception as e:
+        logging.error(f"Could not apply the minimal tab profile: {str(e)}")
+        return None
+
+def reset_minimal_profile(driver):
+    # Undo the throttling and blocking of the current tab before it is handed back to the user
+    try:
+        driver.execute_cdp_cmd("Emulation.setCPUThrottlingRate", {"rate": 1})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+    except Exception as e:
+        logging.error(f"Could not reset the minimal tab profile: {str(e)}")
+
+def run_minimal_profile(driver):
+    # Mute, pick the lowest quality and hide chat on the page that is already loaded
+    try:
+        driver.execute_script(MINIMAL_SCRIPT)
+    except Exception as e:
+        logging.error(f"Could not apply the minimal tab profile to the page: {str(e)}")
+
+def get_tab_metrics(driver):
+    # Main thread CPU time and JavaScript heap of the current tab, with the time they were taken, in seconds and bytes
+    driver.execute_cdp_cmd("Performance.enable", {})
+    metrics = {metric["name"]: metric["value"] for metric in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+    return metrics.get("TaskDuration"), metrics.get("JSHeapUsedSize"), metrics.get("Timestamp")
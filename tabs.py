@@ -0,0 +1,273 @@
+import logging
+
+from browser import init_browser, attach_browser, check_browser_open  # Import browser functions
+from streamers import normalize_login # Import login parser for channel URLs
+from claimer import register_claimer, run_claimer, collect_claims # Import bonus chest claimer functions
+from tabprofile import apply_minimal_profile, reset_minimal_profile, run_minimal_profile, get_tab_metrics # Import farm tab profile functions
+
+class TabPool:
+    def __init__(self, max_tabs=4, debugging_port=None, user_data_dir=None, claim_bonus=True, profile="minimal", cpu_throttling_rate=4, blocked_urls=()):
+        self.max_tabs = max_tabs
+        self.debugging_port = debugging_port
+        self.user_data_dir = user_data_dir
+        self.claim_bonus = claim_bonus
+        self.profile = profile  # "minimal" plays the lowest quality muted, without chat, ads, emotes and extensions, "full" leaves tabs alone
+        self.cpu_throttling_rate = cpu_throttling_rate
+        self.blocked_urls = blocked_urls
+        self.prepared_tabs = {}  # Window handles set up with the claimer and the tab profile for every page they load, to the identifiers of their page scripts
+        self.last_metrics = {}  # Window handle to its CPU time and timestamp at the last resource report
+        self.released_claims = {}  # Streamer login to the bonus chests claimed in tabs that were released since the last collection
+        self.driver = None
+        self.used_tabs = {}  # Window handle to the streamer login farmed in it
+        self.free_tabs = []  # Window handles of open tabs that can be reused
+        self.adopted_tabs = {}  # Streamer login to a tab from before a restart that isn't farmed yet
+        self.on_reset = None  # Optional callback when the browser was launched or attached again, the tabs farmed before are gone
+
+    def is_open(self):
+        return check_browser_open(self.driver)
+
+    def attach(self):
+        # Take over the browser of the last run, so its tabs don't have to be loaded again
+        if self.is_open() or not self.debugging_port:
+            return False
+
+        self.driver = attach_browser(self.debugging_port)
+        if not self.driver:
+            return False
+
+        self.used_tabs = {}
+        self.prepared_tabs = {}
+        self.free_tabs = []
+        self.adopted_tabs = {}
+        for window_handle in self.driver.window_handles:
+            try:
+                self.driver.switch_to.window(window_handle)
+                url = self.driver.current_url
+            except Exception:
+                continue
+
+            # Tabs showing a channel are matched to its streamer, empty tabs can be reused, other tabs are left alone
+            if "twitch.tv/" in url:
+                streamer_login = normalize_login(url)
+                if streamer_login and streamer_login not in self.adopted_tabs:
+                    self.adopted_tabs[streamer_login] = window_handle
+                    continue
+            if url in ("about:blank", "chrome://newtab/", "data:,"):
+                self.free_tabs.append(window_handle)
+
+        logging.info(f"Found {len(self.adopted_tabs)} streamer tabs in the running browser")
+        if self.on_reset:
+            self.on_reset()
+        return True
+
+    def ensure_browser(self):
+        if not self.is_open() and not self.attach():
+            self.driver = init_browser(self.debugging_port, self.user_data_dir)
+
+            # The browser starts with one empty tab, which is used for the first streamer
+            self.used_tabs = {}
+            self.prepared_tabs = {}
+            self.free_tabs = list(self.driver.window_handles)
+            self.adopted_tabs = {}
+            if self.on_reset:
+                self.on_reset()
+
+    def has_free_slot(self):
+        # Adopted tabs count as used until they are farmed or closed
+        return len(self.used_tabs) + len(self.adopted_tabs) < self.max_tabs
+
+    def open(self, streamer_login):
+        self.ensure_browser()
+
+        # Keep farming in the tab that already shows the streamer, without loading the page again
+        window_handle = self.adopted_tabs.pop(streamer_login, None)
+        if window_handle and self.switch_to(window_handle):
+            self.used_tabs[window_handle] = streamer_login
+            self.prepare_tab(window_handle)
+            self.start_tab(window_handle)
+            if self.profile == "minimal":
+                run_minimal_profile(self.driver)
+            return window_handle
+
+        if not self.has_free_slot():
+            return None
+
+        # Reuse an open tab by navigating it, only open a new tab if there is none
+        window_handle = None
+        while self.free_tabs and not window_handle:
+            window_handle = self.free_tabs.pop()
+            if not self.switch_to(window_handle):
+                window_handle = None
+        if not window_handle:
+            self.driver.switch_to.new_window('tab')
+            window_handle = self.driver.current_window_handle
+
+        self.prepare_tab(window_handle)
+        self.driver.get(f"https://www.twitch.tv/{streamer_login}")
+        self.used_tabs[window_handle] = streamer_login
+        self.start_tab(window_handle)
+        return window_handle
+
+    def navigate(self, window_handle, streamer_login):
+        # Farm another streamer in an already used tab, False if the tab was closed
+        if not self.switch_to(window_handle):
+            return False
+        self.collect_released_claims(self.used_tabs.get(window_handle))
+        self.driver.get(f"https://www.twitch.tv/{streamer_login}")
+        self.used_tabs[window_handle] = streamer_login
+        self.start_tab(window_handle)
+        return True
+
+    def prepare_tab(self, window_handle):
+        # Set up the current tab once, before it loads a channel, so the first page load already gets the claimer and the tab profile
+        if window_handle in self.prepared_tabs:
+            return
+        script_ids = self.prepared_tabs[window_handle] = []
+
+        if self.claim_bonus:
+            script_ids.append(register_claimer(self.driver))
+        if self.profile == "minimal":
+            script_ids.append(apply_minimal_profile(self.driver, self.cpu_throttling_rate, self.blocked_urls))
+
+    def unprepare_tab(self, window_handle):
+        # Hand the current tab back to the user as a normal tab, without the page scripts, throttling and blocked requests
+        for script_id in self.prepared_tabs.pop(window_handle, []):
+            if script_id:
+                try:
+                    self.driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script_id})
+                except Exception:
+                    pass
+        if self.profile == "minimal":
+            reset_minimal_profile(self.driver)
+
+    def start_tab(self, window_handle):
+        # Claim bonus chests from inside the loaded page, and start measuring the CPU use of the tab
+        if self.claim_bonus:
+            run_claimer(self.driver)
+        self.last_metrics.pop(window_handle, None)
+        self.sample_metrics(window_handle)
+
+    def sample_metrics(self, window_handle):
+        # Percent of a CPU core used by the main thread of the current tab since the last sample, and its JavaScript heap
+        try:
+            task_duration, heap_size, timestamp = get_tab_metrics(self.driver)
+        except Exception:
+            return None, None
+
+        cpu_percent = None
+        last_metrics = self.last_metrics.get(window_handle)
+        if last_metrics and timestamp > last_metrics[1] and task_duration >= last_metrics[0]:
+            cpu_percent = (task_duration - last_metrics[0]) / (timestamp - last_metrics[1]) * 100
+        self.last_metrics[window_handle] = (task_duration, timestamp)
+        return cpu_percent, heap_size
+
+    def release(self, window_handle):
+        streamer_login = self.used_tabs.pop(window_handle, None)
+        self.last_metrics.pop(window_handle, None)
+        if not self.is_open():
+            return
+
+        try:
+            self.driver.switch_to.window(window_handle)
+
+            self.collect_released_claims(streamer_login)
+
+            # Keep one tab around to reuse, so the browser window doesn't close, and close the rest
+            if self.free_tabs:
+                self.driver.close()
+                self.prepared_tabs.pop(window_handle, None)
+            else:
+                self.unprepare_tab(window_handle)
+                self.driver.get("about:blank")
+                self.free_tabs.append(window_handle)
+        except Exception:
+            logging.error(f"Could not close the tab for {streamer_login}!")
+
+    def release_adopted(self, streamer_logins):
+        # Close tabs from before the restart that no longer get farmed
+        for streamer_login in streamer_logins:
+            window_handle = self.adopted_tabs.pop(streamer_login, None)
+            if window_handle:
+                self.used_tabs[window_handle] = streamer_login
+                self.release(window_handle)
+
+    def switch_to(self, window_handle):
+        # False if the tab was closed by the user, or the browser with it
+        try:
+            self.driver.switch_to.window(window_handle)
+            return True
+        except Exception:
+            self.forget(window_handle)
+            return False
+
+    def forget(self, window_handle):
+        # Drop a closed tab, its streamer has to be farmed in a new tab
+        self.used_tabs.pop(window_handle, None)
+        self.last_metrics.pop(window_handle, None)
+        self.prepared_tabs.pop(window_handle, None)
+        if window_handle in self.free_tabs:
+            self.free_tabs.remove(window_handle)
+
+    def get_current_tab(self):
+        try:
+            return self.driver.current_window_handle
+        except Exception:
+            return None
+
+    def restore_tab(self, window_handle):
+        # Go back to the tab that was shown before a report, if it's still open
+        if window_handle:
+            try:
+                self.driver.switch_to.window(window_handle)
+            except Exception:
+                pass
+
+    def get_resource_report(self):
+        # CPU use since the last report and JavaScript heap of every tab, from the DevTools performance metrics
+        report = {}
+        if not self.is_open():
+            return report
+
+        current_window_handle = self.get_current_tab()
+        for window_handle, streamer_login in list(self.used_tabs.items()):
+            try:
+                self.driver.switch_to.window(window_handle)
+            except Exception:
+                report[streamer_login] = (None, None)
+                continue
+            report[streamer_login] = self.sample_metrics(window_handle)
+        self.restore_tab(current_window_handle)
+
+        return report
+
+    def collect_released_claims(self, streamer_login):
+        # Collect the claims the current page still holds, they are gone once the tab is closed or navigated away
+        if not self.claim_bonus or not streamer_login:
+            return
+        try:
+            self.add_claims(self.released_claims, streamer_login, collect_claims(self.driver))
+        except Exception:
+            logging.debug(f"Could not collect the bonus claims of {streamer_login} before releasing its tab")
+
+    def add_claims(self, claims, streamer_login, claimed):
+        if claimed:
+            claims[streamer_login] = claims.get(streamer_login, 0) + claimed
+
+    def collect_claims(self):
+        # Bonus chests claimed in every tab since the last collection, including tabs that were released in the meantime
+        claims = self.released_claims
+        self.released_claims = {}
+        if not self.is_open() or not self.claim_bonus:
+            return claims
+
+        current_window_handle = self.get_current_tab()
+        for window_handle, streamer_login in list(self.used_tabs.items()):
+            try:
+                self.driver.switch_to.window(window_handle)
+                claimed = collect_claims(self.driver)
+            except Exception:
+                continue
+            self.add_claims(claims, streamer_login, claimed)
+        self.restore_tab(current_window_handle)
+
+        return claims
@@ -0,0 +1,27 @@
+import pytest
+
+from claimer import FIXTURE, run_fixture, check_fixture_result
+
+@pytest.fixture
+def driver():
+    webdriver = pytest.importorskip("selenium.webdriver")
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    try:
+        driver = webdriver.Chrome(options=options)
+    except Exception as e:
+        pytest.skip(f"Chrome is not available: {str(e)}")
+    yield driver
+    driver.quit()
+
+def test_check_fixture_result():
+    assert check_fixture_result(3, 3, 3)
+    assert not check_fixture_result(0, 0, 0)
+    assert not check_fixture_result(3, 2, 2)
+    assert not check_fixture_result(3, 3, 2)
+    assert not check_fixture_result(3, 3, None)
+
+def test_claimer_clicks_every_chest(driver):
+    shown, clicked, claims = run_fixture(driver, FIXTURE, 10)
+    assert shown >= 2
+    assert check_fixture_result(shown, clicked, claims), f"shown: {shown}, clicked: {clicked}, claims: {claims}"
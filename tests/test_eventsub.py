@@ -0,0 +1,147 @@
+import time
+import itertools
+
+import pytest
+
+from conftest import wait_until
+from eventsub import EventSubClient
+from fake_eventsub import FakeEventSub
+
+class FakeAuth:
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.subscriptions = []  # (subscription type, session id) of every created subscription
+        self.deleted = []
+        self.live = {}
+        self.max_total_cost = None  # Subscriptions past this cost get a 429, like a session of unauthorized broadcasters
+        self.report_cost = True
+
+    def create_eventsub_subscription(self, subscription_type, condition, session_id, user_access_token):
+        total_cost = len(self.subscriptions) - len(self.deleted)
+        if self.max_total_cost is not None and total_cost >= self.max_total_cost:
+            return {"data": [], "status": 429}
+
+        self.subscriptions.append((subscription_type, session_id))
+        subscription = {"data": [{"id": f"{subscription_type}-{next(self.ids)}"}]}
+        if self.report_cost and self.max_total_cost is not None:
+            subscription.update(total_cost=total_cost + 1, max_total_cost=self.max_total_cost)
+        return subscription
+
+    def delete_eventsub_subscription(self, subscription_id, user_access_token):
+        self.deleted.append(subscription_id)
+        return True
+
+    def get_live_streams_batch(self, user_logins):
+        return {login: self.live[login] for login in user_logins if login in self.live}
+
+class FakeUserCache:
+    def refresh(self, streamer_logins):
+        return 0
+
+    def get_user_id(self, streamer_login):
+        return "1"
+
+@pytest.fixture
+def server():
+    server = FakeEventSub(keepalive_timeout=1).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def client(server):
+    auth = FakeAuth()
+    client = EventSubClient(auth, FakeUserCache(), "user-token", url=server.url)
+    client.KEEPALIVE_GRACE = 0.5
+    client.RECONNECT_DELAY = 0.1
+    client.set_streamers(["streamer"])
+    client.start()
+    yield client
+    client.stop()
+
+def is_pushed(client):
+    return client.split_streamers(["streamer"])[0] == ["streamer"]
+
+def test_welcome_subscribes_in_the_session(server, client):
+    assert wait_until(lambda: is_pushed(client))
+
+    assert client.session_id == server.sessions[0]
+    assert client.keepalive_timeout == 1
+    assert sorted(client.auth.subscriptions) == [("stream.offline", server.sessions[0]), ("stream.online", server.sessions[0])]
+
+def test_notifications_update_live_streams(server, client):
+    assert wait_until(lambda: is_pushed(client))
+    client.changed.clear()
+
+    server.send_notification("stream.online", "Streamer")
+    assert wait_until(lambda: "streamer" in client.get_live_streams())
+    assert client.changed.is_set()
+
+    server.send_notification("stream.offline", "streamer")
+    assert wait_until(lambda: "streamer" not in client.get_live_streams())
+
+def test_reconnect_keeps_subscriptions(server, client):
+    assert wait_until(lambda: is_pushed(client))
+
+    server.send_reconnect()
+    assert wait_until(lambda: len(server.sessions) == 2 and client.session_id == server.sessions[1])
+
+    # Subscriptions carry over to the new session, so nothing is subscribed again and the streamer stays pushed
+    assert len(client.auth.subscriptions) == 2
+    assert is_pushed(client)
+
+    server.send_notification("stream.online", "streamer")
+    assert wait_until(lambda: "streamer" in client.get_live_streams())
+
+def test_keepalive_timeout_falls_back_to_polling_and_resubscribes(server, client):
+    assert wait_until(lambda: is_pushed(client))
+
+    server.silent = True
+    assert wait_until(lambda: not client.is_connected())
+    assert client.split_streamers(["streamer"]) == ([], ["streamer"])
+
+    server.silent = False
+    assert wait_until(lambda: is_pushed(client) and len(server.sessions) >= 2)
+    assert ("stream.online", client.session_id) in client.auth.subscriptions
+
+def test_revocation_puts_the_streamer_back_on_polling(server, client):
+    assert wait_until(lambda: is_pushed(client))
+
+    server.send_revocation(client.subscriptions["streamer"][0])
+    assert wait_until(lambda: not is_pushed(client))
+
+@pytest.fixture
+def limited_client(server):
+    auth = FakeAuth()
+    auth.max_total_cost = 5
+    client = EventSubClient(auth, FakeUserCache(), "user-token", url=server.url)
+    client.set_streamers(["first", "second", "third"])
+    yield client
+    client.stop()
+
+def test_stops_subscribing_at_the_reported_cost_limit(limited_client):
+    limited_client.start()
+    assert wait_until(lambda: len(limited_client.split_streamers(["first", "second", "third"])[0]) == 2)
+
+    # The third streamer doesn't fit in the remaining cost, so it stays on polling without being tried
+    time.sleep(0.5)
+    assert len(limited_client.auth.subscriptions) == 4
+    assert limited_client.cost_limit_reached
+    assert not limited_client.failed_logins
+
+def test_stops_subscribing_at_the_first_429(limited_client):
+    limited_client.auth.report_cost = False
+    limited_client.start()
+    assert wait_until(lambda: limited_client.cost_limit_reached)
+
+    # The streamer that got a 429 halfway has its created subscription removed and stays on polling with the rest
+    time.sleep(0.5)
+    assert len(limited_client.split_streamers(["first", "second", "third"])[0]) == 2
+    assert len(limited_client.auth.subscriptions) == 5
+    assert len(limited_client.auth.deleted) == 1
+    assert not limited_client.failed_logins
+
+    # Once a streamer is removed the cost is free again, and the polled streamer gets subscribed
+    polled_login = limited_client.split_streamers(["first", "second", "third"])[1][0]
+    removed_login = limited_client.split_streamers(["first", "second", "third"])[0][0]
+    limited_client.set_streamers([login for login in ("first", "second", "third") if login != removed_login])
+    assert wait_until(lambda: polled_login in limited_client.subscriptions)
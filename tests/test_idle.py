@@ -0,0 +1,57 @@
+from conftest import wait_until
+from idle import FakeIdleProvider, IdleMonitor
+
+class FailingProvider(FakeIdleProvider):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def get_idle_duration(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("provider failed")
+        return super().get_idle_duration()
+
+def start_monitor(provider, max_idle_duration=0.2):
+    monitor = IdleMonitor(provider, max_idle_duration)
+    monitor.RETURN_CHECK_INTERVAL = 0.05
+    monitor.changes = []
+    monitor.on_change = lambda: monitor.changes.append(monitor.idle)
+    monitor.start()
+    return monitor
+
+def test_monitor_reports_idle_and_back():
+    provider = FakeIdleProvider()
+    monitor = start_monitor(provider)
+    assert not monitor.idle
+
+    provider.set_idle_duration(10)
+    assert wait_until(lambda: monitor.idle)
+    assert monitor.changed.is_set()
+    monitor.changed.clear()
+
+    provider.set_idle_duration(0)
+    assert wait_until(lambda: not monitor.idle)
+    assert monitor.changed.is_set()
+    assert monitor.changes == [True, False]
+
+def test_monitor_goes_idle_after_the_idle_duration():
+    provider = FakeIdleProvider()
+    monitor = start_monitor(provider)
+
+    # Without any input the user becomes idle once the idle duration has passed
+    assert wait_until(lambda: monitor.idle, timeout=3)
+    assert monitor.changes == [True]
+
+def test_monitor_survives_provider_errors():
+    provider = FailingProvider(failures=2)
+    provider.set_idle_duration(10)
+    monitor = start_monitor(provider)
+
+    assert wait_until(lambda: monitor.idle)
+    assert provider.failures == 0
+
+    provider.failures = 1
+    provider.set_idle_duration(0)
+    assert wait_until(lambda: not monitor.idle)
+    assert monitor.changes == [True, False]
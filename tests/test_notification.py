@@ -0,0 +1,100 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import wait_until
+from notification import NotificationDispatcher, WebhookBackend
+from transport import get_transport
+
+class Receiver:
+    # Local stand-in for a webhook receiver, it records every payload and answers with the set status code
+    def __init__(self):
+        self.payloads = []
+        self.status_code = 204
+
+        receiver = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                receiver.payloads.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(receiver.status_code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+
+    def get_logins(self, index):
+        return [streamer["login"] for streamer in self.payloads[index]["streamers"]]
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.server.shutdown()
+    receiver.server.server_close()
+
+def get_user_info(streamer_login):
+    return {"login": streamer_login, "display_name": streamer_login.title()}
+
+def test_go_lives_are_coalesced(receiver):
+    dispatcher = NotificationDispatcher([WebhookBackend(receiver.url)], coalesce_window=0.5)
+
+    assert dispatcher.notify(get_user_info("first"), "First stream")
+    assert dispatcher.notify(get_user_info("second"), "Second stream")
+    assert wait_until(lambda: receiver.payloads)
+
+    assert len(receiver.payloads) == 1
+    assert receiver.get_logins(0) == ["first", "second"]
+    assert receiver.payloads[0]["content"].startswith("2 streamers are live!")
+
+def test_sent_streamers_are_throttled(receiver):
+    dispatcher = NotificationDispatcher([WebhookBackend(receiver.url)], coalesce_window=0.1, throttle=60)
+    sent = []
+    dispatcher.on_sent = sent.append
+
+    assert dispatcher.notify(get_user_info("streamer"), "Stream")
+    assert not dispatcher.notify(get_user_info("streamer"), "Stream")  # Already queued
+    assert wait_until(lambda: sent == ["streamer"])
+
+    assert not dispatcher.notify(get_user_info("streamer"), "Stream")
+    assert dispatcher.notify(get_user_info("other"), "Other stream")
+    assert wait_until(lambda: sent == ["streamer", "other"])
+    assert [receiver.get_logins(index) for index in range(len(receiver.payloads))] == [["streamer"], ["other"]]
+
+def test_failed_notifications_are_not_throttled(receiver):
+    dispatcher = NotificationDispatcher([WebhookBackend(receiver.url)], coalesce_window=0.1, throttle=60)
+    sent = []
+    dispatcher.on_sent = sent.append
+
+    receiver.status_code = 400
+    assert dispatcher.notify(get_user_info("streamer"), "Stream")
+    assert wait_until(lambda: receiver.payloads and not dispatcher.pending)
+    assert sent == []
+
+    receiver.status_code = 204
+    assert dispatcher.notify(get_user_info("streamer"), "Stream")
+    assert wait_until(lambda: sent == ["streamer"])
+    assert len(receiver.payloads) == 2
+
+def test_webhook_path_is_not_exported(receiver):
+    dispatcher = NotificationDispatcher([WebhookBackend(receiver.url)], coalesce_window=0.1)
+    sent = []
+    dispatcher.on_sent = sent.append
+
+    assert dispatcher.notify(get_user_info("streamer"), "Stream")
+    assert wait_until(lambda: sent == ["streamer"])
+
+    # The webhook path carries the webhook token, so the endpoint stats only get the endpoint name
+    endpoints = get_transport().get_stats()["endpoints"]
+    assert "POST webhook" in endpoints
+    assert not [endpoint for endpoint in endpoints if "/webhook" in endpoint]
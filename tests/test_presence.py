@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from conftest import wait_until
+from fake_hls import FakeHLS
+from transport import Transport
+from presence import PresenceFarmer, parse_master_playlist, parse_media_playlist
+
+@pytest.fixture
+def server():
+    server = FakeHLS(target_duration=1).start()
+    server.live.add("streamer")
+    yield server
+    server.stop()
+
+@pytest.fixture
+def farmer(server):
+    farmer = PresenceFarmer(fetch_segments=True, transport=Transport(max_retries=0))
+    farmer.GQL_URL = server.gql_url
+    farmer.USHER_URL = server.usher_url
+    yield farmer
+    for streamer_login in list(farmer.streams):
+        farmer.stop(streamer_login)
+
+def test_parse_playlists(server):
+    renditions = parse_master_playlist(server.get_master_playlist("streamer"), "http://127.0.0.1/api/channel/hls/streamer.m3u8")
+    assert min(renditions) == (230000, "http://127.0.0.1/hls/streamer/160p30.m3u8")
+    assert len(renditions) == 4
+
+    playlist = "#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.000,live\nsegment1.ts\n#EXTINF:6.000,live\nsegment2.ts\n"
+    assert parse_media_playlist(playlist, "http://127.0.0.1/hls/streamer/160p30.m3u8") == (6, ["http://127.0.0.1/hls/streamer/segment1.ts", "http://127.0.0.1/hls/streamer/segment2.ts"])
+
+    with pytest.raises(ValueError):
+        parse_media_playlist("<html></html>", "http://127.0.0.1/")
+
+def test_farms_the_lowest_rendition(server, farmer):
+    farmer.start("streamer")
+    assert wait_until(lambda: server.get_requests("/hls/streamer/segment"))
+
+    assert server.get_requests("/hls/streamer/160p30.m3u8")
+    assert not [path for _, path in server.requests if path.endswith(".m3u8") and path.startswith("/hls/") and "160p30" not in path]
+    assert farmer.streams["streamer"]["playlist_url"].endswith("/hls/streamer/160p30.m3u8")
+
+def test_refreshes_at_the_target_duration(server, farmer):
+    farmer.start("streamer")
+    assert wait_until(lambda: len(server.get_requests("/hls/streamer/160p30.m3u8")) >= 3)
+
+    # One access token for the whole session, and a playlist refresh about every target duration
+    refreshes = server.get_requests("/hls/streamer/160p30.m3u8")
+    assert len(server.get_requests("/gql")) == 1
+    assert all(0.8 <= later - earlier <= 1.5 for earlier, later in zip(refreshes, refreshes[1:]))
+
+def test_backs_off_and_gets_a_new_playlist_url_after_failures(server, farmer):
+    farmer.start("streamer")
+    assert wait_until(lambda: server.get_requests("/hls/streamer/160p30.m3u8"))
+
+    server.fail_playlists = 2
+    assert wait_until(lambda: farmer.streams["streamer"]["failures"] == 2, timeout=5)
+    assert wait_until(lambda: farmer.streams["streamer"]["failures"] == 0, timeout=8)
+
+    # Every failure gets a new access token and master playlist, with a growing delay in between
+    access_tokens = server.get_requests("/gql")
+    assert len(access_tokens) == 3
+    assert 3.5 <= access_tokens[2] - access_tokens[1] <= 5
+    assert len(server.get_requests("/api/channel/hls/streamer.m3u8")) == 3
+
+def test_stop_ends_the_refreshes(server, farmer):
+    farmer.start("streamer")
+    assert wait_until(lambda: server.get_requests("/hls/streamer/160p30.m3u8"))
+
+    farmer.stop("streamer")
+    assert not farmer.is_farming("streamer")
+    time.sleep(0.2)
+    requests = len(server.requests)
+    time.sleep(1.5)
+    assert len(server.requests) == requests
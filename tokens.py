@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import logging
+import requests
+import threading
+
+class TokenManager:
+    MAX_REFRESH_MARGIN = 60 * 60  # Refresh the token at most this many seconds before it expires
+    REFRESH_TIMEOUT = 30
+
+    def __init__(self, client_id, client_secret, grant_type, oauth_url, transport, filename="token.json"):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.grant_type = grant_type
+        self.oauth_url = oauth_url
+        self.transport = transport
+        self.filename = filename
+
+        self.lock = threading.Lock()
+        self.refreshing = None  # Event of the refresh in flight, shared by every caller that needs a token
+        self.access_token = None
+        self.token_type = None
+        self.expires_in = None
+        self.expires_at = 0
+
+        self.load()
+
+    def load(self):
+        # Reuse the token from the last run for a fast warm start
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r') as file:
+                token = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read {self.filename}: {str(e)}")
+            return
+
+        if token.get("client_id") == self.client_id and token.get("grant_type") == self.grant_type and token.get("oauth_url", self.oauth_url) == self.oauth_url:
+            self.access_token = token["access_token"]
+            self.token_type = token["token_type"]
+            self.expires_in = token["expires_in"]
+            self.expires_at = token["expires_at"]
+
+    def save(self):
+        token = {
+            "client_id": self.client_id,
+            "grant_type": self.grant_type,
+            "oauth_url": self.oauth_url,
+            "access_token": self.access_token,
+            "token_type": self.token_type,
+            "expires_in": self.expires_in,
+            "expires_at": self.expires_at
+        }
+
+        # Write to a temporary file first, so a crash never leaves a half written token behind
+        try:
+            temp_filename = f"{self.filename}.tmp"
+            with open(temp_filename, 'w') as file:
+                json.dump(token, file)
+            os.replace(temp_filename, self.filename)
+        except OSError as e:
+            logging.error(f"Could not write {self.filename}: {str(e)}")
+
+    def is_fresh(self):
+        # Refresh proactively, a tenth of the token lifetime or an hour before it expires, whichever is sooner
+        refresh_margin = min((self.expires_in or 0) / 10, self.MAX_REFRESH_MARGIN)
+        return self.access_token and time.time() < self.expires_at - refresh_margin
+
+    def get_token(self):
+        with self.lock:
+            if self.is_fresh():
+                return self.access_token
+        return self.refresh()
+
+    def invalidate(self, rejected_token):
+        # Called after a 401, only refresh if nobody replaced the rejected token yet
+        with self.lock:
+            if self.access_token != rejected_token and self.is_fresh():
+                return self.access_token
+            self.expires_at = 0
+        return self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            # Wait for the refresh in flight instead of starting another one
+            refreshing = self.refreshing
+            if not refreshing:
+                self.refreshing = threading.Event()
+
+        if refreshing:
+            refreshing.wait(self.REFRESH_TIMEOUT)
+            return self.access_token if self.is_fresh() else None
+
+        try:
+            data = {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": self.grant_type
+            }
+
+            try:
+                response = self.transport.post(self.oauth_url, data=data, endpoint="oauth2/token")
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error during authentication: {str(e)}")
+                return None
+
+            response_json = response.json()
+            with self.lock:
+                self.access_token = response_json["access_token"]
+                self.expires_in = response_json["expires_in"]
+                self.token_type = response_json["token_type"]
+                self.expires_at = time.time() + self.expires_in
+            self.save()
+
+            logging.info("Access token refreshed!")
+            return self.access_token
+        finally:
+            with self.lock:
+                self.refreshing.set()
+                self.refreshing = None
@@ -0,0 +1,163 @@
+import time
+import random
+import logging
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+
+class TokenBucket:
+    def __init__(self, capacity=800, refill_period=60):
+        self.capacity = capacity
+        self.refill_period = refill_period
+        self.tokens = capacity
+        self.reset_at = None  # Wall clock time at which the server says the bucket is full again
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+
+        # Once the server reported reset time has passed, the bucket is full again
+        if self.reset_at and time.time() >= self.reset_at:
+            self.tokens = self.capacity
+            self.reset_at = None
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.refill_period)
+        self.updated = now
+
+    def acquire(self, cost=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+
+                # Wait until the reset time if the server gave us one, otherwise until enough tokens are refilled
+                if self.reset_at:
+                    wait = self.reset_at - time.time()
+                else:
+                    wait = (cost - self.tokens) * self.refill_period / self.capacity
+
+            logging.debug(f"Rate limit budget exhausted, waiting {wait:.2f} seconds")
+            time.sleep(max(wait, 0.05))
+
+    def update_from_headers(self, headers):
+        try:
+            limit = int(headers["Ratelimit-Limit"]) if "Ratelimit-Limit" in headers else None
+            remaining = int(headers["Ratelimit-Remaining"])
+            reset = int(headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            return
+
+        with self.lock:
+            if limit:
+                self.capacity = limit
+            self.tokens = remaining
+            self.reset_at = reset
+            self.updated = time.monotonic()
+
+class Transport:
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size=10, max_retries=4, backoff_base=0.5, backoff_max=30, timeout=10):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        # Keep-alive connection pool shared by every request made through this transport
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.buckets = {}  # Rate limit budget per host, created once a host reports Ratelimit headers
+        self.endpoint_stats = {}  # Request counts and latencies per endpoint
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, endpoint=None, retry=True, **kwargs):
+        # Stats and retry warnings use the endpoint name given by the caller, or only the host. Paths of caller supplied
+        # urls can hold secrets, like webhook tokens, and would add a new endpoint for every profile image or HLS segment
+        parsed_url = urlparse(url)
+        endpoint = f"{method} {endpoint or parsed_url.netloc}"
+        kwargs.setdefault("timeout", self.timeout)
+
+        # Requests that can't be retried, like EventSub subscriptions past the session limit, return the first response
+        max_retries = self.max_retries if retry else 0
+
+        attempt = 0
+        while True:
+            bucket = self.buckets.get(parsed_url.netloc)
+            if bucket:
+                bucket.acquire()
+
+            start_time = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(endpoint, time.monotonic() - start_time, None)
+                if attempt >= max_retries:
+                    raise
+                self._backoff(endpoint, attempt, "connection error")
+                attempt += 1
+                continue
+
+            self._record(endpoint, time.monotonic() - start_time, response.status_code)
+
+            # Follow the rate limit budget reported by the server
+            if "Ratelimit-Remaining" in response.headers:
+                if not bucket:
+                    bucket = self.buckets.setdefault(parsed_url.netloc, TokenBucket())
+                bucket.update_from_headers(response.headers)
+
+            if response.status_code in self.RETRY_STATUS_CODES and attempt < max_retries:
+                self._backoff(endpoint, attempt, f"status code {response.status_code}")
+                attempt += 1
+                continue
+
+            return response
+
+    def _backoff(self, endpoint, attempt, reason):
+        # Exponential backoff with full jitter
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        logging.warning(f"{endpoint} failed with {reason}, retrying in {delay:.2f} seconds")
+        time.sleep(delay)
+
+    def _record(self, endpoint, elapsed, status_code):
+        with self.lock:
+            stats = self.endpoint_stats.setdefault(endpoint, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if status_code is None or status_code >= 400:
+                stats["errors"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            endpoint_stats = {}
+            for endpoint, stats in self.endpoint_stats.items():
+                endpoint_stats[endpoint] = dict(stats, average_seconds=stats["total_seconds"] / stats["count"])
+
+        rate_limits = {}
+        for host, bucket in list(self.buckets.items()):
+            rate_limits[host] = {"capacity": bucket.capacity, "remaining": bucket.tokens, "reset_at": bucket.reset_at}
+
+        return {"endpoints": endpoint_stats, "rate_limits": rate_limits}
+
+shared_transport = None
+
+def get_transport():
+    global shared_transport
+
+    # Every caller shares the same connection pool and rate limit budget
+    if shared_transport is None:
+        shared_transport = Transport()
+    return shared_transport
@@ -1,36 +1,70 @@
+import math
 import requests
 import logging
 
+from transport import get_transport  # Import shared HTTP transport
+from tokens import TokenManager  # Import app access token manager
+
+# Seconds of check interval required per /streams request, to avoid spamming Twitch servers
+SECONDS_PER_REQUEST = 5
+
 class TwitchAuth:
     API_BASE_URL = "https://api.twitch.tv/helix"
     OAUTH_URL = "https://id.twitch.tv/oauth2/token"
+    BATCH_SIZE = 100  # Maximum number of user_id/user_login values Helix accepts per request
+
+    def __init__(self, client_id, client_secret, grant_type="client_credentials", transport=None, token_file="token.json", api_base_url=None, oauth_url=None):
+        # Point at another Helix server, like fake_helix.py, instead of Twitch
+        if api_base_url:
+            self.API_BASE_URL = api_base_url
+        if oauth_url:
+            self.OAUTH_URL = oauth_url
 
-    def __init__(self, client_id, client_secret, grant_type="client_credentials"):
+        self.transport = transport or get_transport()
         self.client_id = client_id
         self.client_secret = client_secret
         self.grant_type = grant_type
-        self.access_token = None
-        self.expires_in = None
-        self.token_type = None
+        self.tokens = TokenManager(client_id, client_secret, grant_type, self.OAUTH_URL, self.transport, token_file)
+
+    @property
+    def access_token(self):
+        return self.tokens.access_token
+
+    @property
+    def expires_in(self):
+        return self.tokens.expires_in
+
+    @property
+    def token_type(self):
+        return self.tokens.token_type
 
     def authenticate(self):
-        data = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "grant_type": self.grant_type
-        }
+        # Uses the cached token if it is still fresh, otherwise gets a new one
+        return self.tokens.get_token() is not None
 
-        try:
-            response = requests.post(self.OAUTH_URL, data=data)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error during authentication: {str(e)}")
-            return
+    def request(self, method, url, access_token=None, **kwargs):
+        # Helix endpoints are named by their path, like helix/streams
+        if url.startswith(self.API_BASE_URL):
+            kwargs.setdefault("endpoint", f"helix{url[len(self.API_BASE_URL):]}")
+
+        # Requests made with a user access token can't be retried with a new app access token
+        if access_token:
+            headers = {"Client-ID": self.client_id, "Authorization": f"Bearer {access_token}"}
+            return self.transport.request(method, url, headers=headers, **kwargs)
 
-        response_json = response.json()
-        self.access_token = response_json["access_token"]
-        self.expires_in = response_json["expires_in"]
-        self.token_type = response_json["token_type"]
+        app_access_token = self.tokens.get_token()
+        for attempt in range(2):
+            if not app_access_token:
+                raise requests.exceptions.RequestException("No app access token, authentication failed")
+
+            headers = {"Client-ID": self.client_id, "Authorization": f"Bearer {app_access_token}"}
+            response = self.transport.request(method, url, headers=headers, **kwargs)
+
+            # Retry once with a fresh token if the token was revoked or expired early
+            if response.status_code != 401 or attempt:
+                return response
+            logging.warning("Access token was rejected, refreshing it")
+            app_access_token = self.tokens.invalidate(app_access_token)
 
     def get_live_streams(self, user_id=None, user_login=None, game_id=None, stream_type="all", language=None, limit=20, before=None, after=None):
         url = f"{self.API_BASE_URL}/streams"
@@ -46,13 +80,8 @@ class TwitchAuth:
             "after": after
         }
 
-        headers = {
-            "Client-ID": self.client_id,
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
         try:
-            response = requests.get(url, params=params, headers=headers)
+            response = self.request("GET", url, params=params)
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             logging.error(f"Error getting live streams: {str(e)}")
@@ -60,6 +89,30 @@ class TwitchAuth:
 
         return response.json()
 
+    def get_live_streams_batch(self, user_ids=None, user_logins=None):
+        url = f"{self.API_BASE_URL}/streams"
+
+        # Helix accepts up to 100 user_id and user_login values combined in a single request
+        lookups = [("user_id", user_id) for user_id in user_ids or []]
+        lookups += [("user_login", user_login) for user_login in user_logins or []]
+
+        live_streams = {}
+        for start in range(0, len(lookups), self.BATCH_SIZE):
+            params = lookups[start:start + self.BATCH_SIZE] + [("type", "live"), ("first", self.BATCH_SIZE)]
+
+            try:
+                response = self.request("GET", url, params=params)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error getting live streams: {str(e)}")
+                return None
+
+            # Map each live stream to its (lowercase) streamer login
+            for stream in response.json().get("data", []):
+                live_streams[stream["user_login"].lower()] = stream
+
+        return live_streams
+
     def get_users_info(self, user_id=None, user_login=None):
         url = f"{self.API_BASE_URL}/users"
 
@@ -68,16 +121,83 @@ class TwitchAuth:
             "login": user_login
         }
 
-        headers = {
-            "Client-ID": self.client_id,
-            "Authorization": f"Bearer {self.access_token}"
+        try:
+            response = self.request("GET", url, params=params)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error getting user info: {str(e)}")
+            return None
+
+        return response.json()
+
+    def get_users_info_batch(self, user_ids=None, user_logins=None):
+        url = f"{self.API_BASE_URL}/users"
+
+        # Helix accepts up to 100 id and login values combined in a single request
+        lookups = [("id", user_id) for user_id in user_ids or []]
+        lookups += [("login", user_login) for user_login in user_logins or []]
+
+        # A failed batch is skipped, the other batches still return their users. None only if every batch failed
+        users_info = {}
+        failed_batches = 0
+        batch_count = (len(lookups) + self.BATCH_SIZE - 1) // self.BATCH_SIZE
+        for start in range(0, len(lookups), self.BATCH_SIZE):
+            batch = lookups[start:start + self.BATCH_SIZE]
+            try:
+                response = self.request("GET", url, params=batch)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error getting user info for {len(batch)} users ({batch[0][1]} to {batch[-1][1]}): {str(e)}")
+                failed_batches += 1
+                if failed_batches == batch_count:
+                    return None
+                continue
+
+            # Map each user to its (lowercase) login
+            for user_info in response.json().get("data", []):
+                users_info[user_info["login"].lower()] = user_info
+
+        return users_info
+
+    def create_eventsub_subscription(self, subscription_type, condition, session_id, access_token=None, version="1"):
+        url = f"{self.API_BASE_URL}/eventsub/subscriptions"
+
+        data = {
+            "type": subscription_type,
+            "version": version,
+            "condition": condition,
+            "transport": {
+                "method": "websocket",
+                "session_id": session_id
+            }
         }
 
+        # WebSocket subscriptions require a user access token instead of the app access token
         try:
-            response = requests.get(url, params=params, headers=headers)
+            response = self.request("POST", url, access_token, json=data, retry=False)
+
+            # A 429 means the session reached its subscription limit, retrying won't help until subscriptions are removed
+            if response.status_code == 429:
+                return {"data": [], "status": 429}
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error getting user info: {str(e)}")
+            logging.error(f"Error creating EventSub subscription: {str(e)}")
             return None
 
         return response.json()
+
+    def delete_eventsub_subscription(self, subscription_id, access_token=None):
+        url = f"{self.API_BASE_URL}/eventsub/subscriptions"
+
+        try:
+            response = self.request("DELETE", url, access_token, params={"id": subscription_id})
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error deleting EventSub subscription: {str(e)}")
+            return False
+
+        return True
+
+def get_minimum_check_interval(streamer_count):
+    # The minimum interval depends on the number of /streams requests, not the number of streamers
+    return math.ceil(streamer_count / TwitchAuth.BATCH_SIZE) * SECONDS_PER_REQUEST
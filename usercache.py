@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import logging
+import threading
+
+class UserCache:
+    FIELDS = ("id", "login", "display_name", "profile_image_url")
+
+    def __init__(self, auth, filename="users.json", ttl=24 * 60 * 60):
+        self.auth = auth
+        self.filename = filename
+        self.ttl = ttl
+        self.users = {}  # Streamer login to cached user info, or a missing marker for logins Twitch doesn't know
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r') as file:
+                self.users = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read {self.filename}, starting with an empty user cache: {str(e)}")
+            self.users = {}
+
+    def save(self):
+        with self.lock:
+            users = dict(self.users)
+
+        # Write to a temporary file first, so a crash never leaves a half written cache behind
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, 'w') as file:
+            json.dump(users, file)
+        os.replace(temp_filename, self.filename)
+
+    def get(self, streamer_login):
+        # In-memory lookup only, expired entries are still returned until they are refreshed
+        user_info = self.users.get(streamer_login.lower())
+        if user_info and not user_info.get("missing"):
+            return user_info
+        return None
+
+    def get_user_id(self, streamer_login):
+        user_info = self.get(streamer_login)
+        return user_info['id'] if user_info else None
+
+    def refresh(self, streamer_logins, force=False):
+        now = time.time()
+
+        # Only look up streamers that are unknown or whose cached info has expired
+        stale_logins = []
+        for streamer_login in dict.fromkeys(streamer_login.lower() for streamer_login in streamer_logins):
+            user_info = self.users.get(streamer_login)
+            if force or not user_info or now - user_info['fetched_at'] > self.ttl:
+                stale_logins.append(streamer_login)
+
+        if not stale_logins:
+            return 0
+
+        # Look up one batch at a time, so only the logins of a failed batch are left for the next refresh
+        refreshed_logins = []
+        users_info = {}
+        for start in range(0, len(stale_logins), self.auth.BATCH_SIZE):
+            batch = stale_logins[start:start + self.auth.BATCH_SIZE]
+            batch_users_info = self.auth.get_users_info_batch(user_logins=batch)
+            if batch_users_info is not None:
+                refreshed_logins += batch
+                users_info.update(batch_users_info)
+
+        if not refreshed_logins:
+            return 0
+
+        with self.lock:
+            for streamer_login in refreshed_logins:
+                user_info = users_info.get(streamer_login)
+                if user_info:
+                    self.users[streamer_login] = {field: user_info[field] for field in self.FIELDS}
+                    self.users[streamer_login]['fetched_at'] = now
+                else:
+                    # Remember logins that don't exist, so they aren't looked up every cycle
+                    self.users[streamer_login] = {'missing': True, 'fetched_at': now}
+
+        try:
+            self.save()
+        except OSError as e:
+            logging.error(f"Could not write {self.filename}: {str(e)}")
+
+        logging.debug(f"Refreshed user info for {len(refreshed_logins)} streamers")
+        return len(refreshed_logins)